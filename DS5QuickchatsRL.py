@@ -14,6 +14,7 @@ HOW IT WORKS:
 
 USAGE:
     python DS5QuickchatsRL.py [--dry-run] [--chat-mode lobby|team|party]
+    python DS5QuickchatsRL.py --input stdin --dry-run     (no controller)
 
 D-PAD COMBOS:
     UP + UP       = "I got it!" variations
@@ -47,16 +48,42 @@ LICENSE: Do whatever you want with it, just have fun in ranked.
 from __future__ import annotations
 
 import argparse
+import bisect
+import difflib
+import glob
+import hashlib
+import heapq
 import json
+import marshal
 import os
+import queue
+import select
+import signal
+import struct
 import sys
+import threading
 import time
 import unicodedata
-from dataclasses import dataclass, field
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from itertools import islice
 from random import sample
-from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+from typing import BinaryIO, Callable, Deque, Dict, FrozenSet, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, TextIO, Tuple, Union, cast
 
-import pygame
+# Skip pygame's "Hello from the pygame community" banner (it costs startup time)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+_pygame_import_started = time.perf_counter()
+try:
+    import pygame
+except ImportError:  # The engine and benchmarks work without it; main() needs it
+    pygame = None  # type: ignore[assignment]
+PYGAME_IMPORT_S = time.perf_counter() - _pygame_import_started
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: JSON message packs still work
+    tomllib = None  # type: ignore[assignment]
 
 
 # =============================================================================
@@ -501,6 +528,69 @@ BUTTONS: Mapping[str, int] = {
 }
 
 
+# =============================================================================
+# MACRO DEFINITIONS
+# =============================================================================
+# Each tuple of inputs maps to a template string. Most are two D-pad
+# directions, but longer sequences (3-4 steps) and button names from
+# BUTTONS work too, e.g. ("L1", "up", "up"). See COMBO MATCHING.
+# Templates can be plain text or include {category} placeholders.
+#
+# Message packs (--pack) can add or replace macros without editing this file.
+# =============================================================================
+
+macros: Mapping[Tuple[str, ...], str] = {
+    # Callouts
+    ("up", "up"):       "{I Got It}",           # I got it!
+    ("up", "down"):     "{Defending}",          # Defending...
+    ("up", "left"):     "{Need Boost}",         # Need boost!
+    ("right", "up"):    "{Centering}",          # Centering!
+
+    # Positive reactions
+    ("left", "up"):     "{Nice One}",           # Nice shot/pass!
+    ("left", "right"):  "{Thanks}",             # Thanks!
+    ("left", "down"):   "{Celebration}",        # Let's go!
+    ("left", "left"):   "{compliment}",         # Quick compliment
+    ("right", "left"):  "{compliment}",         # Quick compliment (alt)
+
+    # Morale
+    ("up", "right"):    "{Confidence Boost}",   # We got this!
+    ("down", "up"):     "{Greeting}",           # Hello!
+
+    # Responses
+    ("down", "right"):  "{No Problem}",         # No problem (sarcastic)
+    ("down", "left"):   "{Apology}",            # Sorry!
+
+    # Taunts & Challenges
+    ("right", "right"): "{Encouraging Taunt}",  # Nice try!
+    ("right", "down"):  "{Challenge}",          # Fight me!
+
+    # The best feature
+    ("down", "down"):   "{cat fact}",           # CAT FAX!
+}
+
+# Send priority of each category. When messages back up (say, behind a long
+# cat fact), higher priority ones are typed first and can push lower priority
+# ones out of a full queue. Unlisted categories are PRIORITY_NORMAL; a
+# template that mixes categories gets the highest of their priorities.
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+category_priorities: Mapping[str, int] = {
+    # Time-critical callouts
+    "I Got It": PRIORITY_HIGH,
+    "Defending": PRIORITY_HIGH,
+    "Need Boost": PRIORITY_HIGH,
+    "Centering": PRIORITY_HIGH,
+
+    # Banter can wait (or be dropped)
+    "Encouraging Taunt": PRIORITY_LOW,
+    "Challenge": PRIORITY_LOW,
+    "cat fact": PRIORITY_LOW,
+}
+
+
 # =============================================================================
 # CHAT KEY CONFIGURATION
 # =============================================================================
@@ -534,13 +624,26 @@ class ChatSettings:
         chat_keys: Mapping of chat modes to keyboard keys
         chat_spam_interval_s: Delay between message sends (for spam protection)
         typing_interval_s: Delay between keystrokes (pyautogui setting)
+        chat_open_delay_s: Wait after opening chat before typing starts
+        backend: Keystroke backend name (see CHAT_BACKENDS)
         dry_run: If True, print messages instead of actually typing them
+        chat_burst: Messages the sender may send back to back before
+                    the rate limit kicks in
+        chat_rate_per_s: Sustained messages per second once the burst is
+                         used up (0 disables the limiter)
+        message_ttl_s: Queued messages older than this are dropped instead
+                       of sent late (0 keeps them forever)
     """
     chat_mode: str = "lobby"
     chat_keys: Mapping[str, str] = field(default_factory=lambda: dict(DEFAULT_CHAT_KEYS))
     chat_spam_interval_s: float = 0.2
     typing_interval_s: float = 0.001
+    chat_open_delay_s: float = 0.05
+    backend: str = "pyautogui"
     dry_run: bool = False
+    chat_burst: int = 3
+    chat_rate_per_s: float = 0.5
+    message_ttl_s: float = 3.0
 
 
 @dataclass
@@ -551,27 +654,87 @@ class RecentMessageCache:
     This prevents the same message from being sent twice within the cooldown
     window, even if the random picker happens to select it again.
 
+    Internally this is a dict (message -> last time sent) for O(1) lookups,
+    plus a deque of (message, time) in the order messages were sent. Expiry
+    only pops entries off the old end of the deque, so checking a message
+    costs the same whether 20 or 20,000 messages are being tracked.
+
     Attributes:
         cooldown_s: How long (in seconds) before a message can be repeated
         max_entries: Maximum number of messages to track (older ones are pruned)
     """
     cooldown_s: float = 600.0   # 10 minutes default cooldown
-    max_entries: int = 200      # Keep track of up to 200 recent messages
-    _entries: List[Tuple[str, float]] = field(default_factory=list)
+    max_entries: int = 20000    # Plenty for long sessions with big message packs
+    _last_sent: Dict[str, float] = field(default_factory=dict)
+    _order: Deque[Tuple[str, float]] = field(default_factory=deque)
+
+    def __len__(self) -> int:
+        return len(self._last_sent)
+
+    def _pop_oldest(self) -> None:
+        message, t = self._order.popleft()
+        # Only forget the message if this was its most recent send;
+        # otherwise a newer entry further along the deque still covers it.
+        if self._last_sent.get(message) == t:
+            del self._last_sent[message]
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.cooldown_s
+        order = self._order
+        while order and order[0][1] < cutoff:
+            self._pop_oldest()
 
     def seen_recently(self, message: str, now: float) -> bool:
         """Check if we've sent this exact message recently."""
-        cutoff = now - self.cooldown_s
-        # Prune old entries while we're at it
-        self._entries = [(m, t) for (m, t) in self._entries if t >= cutoff]
-        return any(m == message for (m, _) in self._entries)
+        self._expire(now)
+        t = self._last_sent.get(message)
+        return t is not None and t >= now - self.cooldown_s
 
     def add(self, message: str, now: float) -> None:
         """Record that we sent this message at this time."""
-        self._entries.append((message, now))
-        # Cap the list size to prevent unbounded memory growth
-        if len(self._entries) > self.max_entries:
-            self._entries = self._entries[-self.max_entries:]
+        if self._last_sent.get(message) == now:
+            return
+        self._last_sent[message] = now
+        self._order.append((message, now))
+        # Cap the size to prevent unbounded memory growth
+        while len(self._order) > self.max_entries:
+            self._pop_oldest()
+
+    def sent_at(self, message: str) -> Optional[float]:
+        """When this message was last recorded as sent (None if it wasn't)."""
+        return self._last_sent.get(message)
+
+    def discard(self, message: str, t: float, previous: Optional[float] = None) -> None:
+        """
+        Take back the send recorded by add(message, t), e.g. because the
+        message was never delivered after all.
+
+        Args:
+            previous: sent_at(message) from before that add(); an older
+                      send that is still on cooldown keeps counting
+        """
+        if self._last_sent.get(message) != t:
+            return
+        if previous is not None:
+            self._last_sent[message] = previous
+        else:
+            del self._last_sent[message]
+
+    def expires_at(self, message: str) -> float:
+        """When a message comes off cooldown (-inf if it isn't on cooldown)."""
+        t = self._last_sent.get(message)
+        return t + self.cooldown_s if t is not None else float("-inf")
+
+    def entries(self) -> List[Tuple[str, float]]:
+        """All tracked (message, time) pairs, oldest first (for persistence)."""
+        return [(m, t) for (m, t) in self._order if self._last_sent.get(m) == t]
+
+    def load(self, entries: Sequence[Tuple[str, float]]) -> None:
+        """Replace the tracked messages with previously saved entries."""
+        self._last_sent.clear()
+        self._order.clear()
+        for message, t in sorted(entries, key=lambda e: e[1])[-self.max_entries:]:
+            self.add(message, t)
 
 
 # =============================================================================
@@ -583,6 +746,37 @@ class RecentMessageCache:
 # =============================================================================
 
 
+def category_hash(items: Sequence[str]) -> str:
+    """Short fingerprint of a category's items (detects edited packs)."""
+    digest = hashlib.blake2b(digest_size=8)
+    for item in items:
+        digest.update(item.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class CategoryExhausted(LookupError):
+    """
+    Raised when every item in a category is excluded (e.g. on cooldown).
+
+    Attributes:
+        key: The canonical category name
+        size: How many items the category has
+    """
+
+    def __init__(self, key: str, size: int) -> None:
+        super().__init__(f'All {size} items in "{key}" are excluded')
+        self.key = key
+        self.size = size
+
+
+@dataclass
+class ShuffleBag:
+    """One category's items in dealing order, and how many were dealt."""
+    randomized: List[str]
+    i: int = 0
+
+
 class VariationPicker:
     """
     Picks random variations from categories without immediate repetition.
@@ -593,14 +787,152 @@ class VariationPicker:
 
     This gives better perceived randomness than pure random selection,
     which can feel "streaky" and repeat items unexpectedly.
+
+    Bags are created lazily on a category's first pick. Bag order and
+    position can be exported and restored across sessions (see
+    export_state/restore_state), so a restart doesn't start every bag over.
     """
 
-    def __init__(self, variations_map: Mapping[str, Sequence[str]]) -> None:
-        self._variations = {k: list(v) for k, v in variations_map.items()}
-        self._state: Dict[str, Dict[str, object]] = {}
-        # Initialize shuffle state for each category
+    def __init__(
+        self,
+        variations_map: Mapping[str, Sequence[str]],
+        alias_index: Optional[Tuple[Mapping[str, str], Mapping[str, str]]] = None,
+    ) -> None:
+        self._variations: Dict[str, List[str]] = {}
+        self._state: Dict[str, ShuffleBag] = {}
+        self._saved_state: Dict[str, Mapping[str, object]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._folded_aliases: Dict[str, str] = {}
+        self._known_keys: Tuple[str, ...] = ()
+        if alias_index is None:
+            self.update_variations(variations_map)
+        else:
+            # Prebuilt index from a compiled bundle (see alias_index())
+            self._variations = {k: list(v) for k, v in variations_map.items()}
+            self._aliases = dict(alias_index[0])
+            self._folded_aliases = dict(alias_index[1])
+            self._known_keys = tuple(sorted(self._variations))
+
+    def update_variations(self, variations_map: Mapping[str, Sequence[str]]) -> List[str]:
+        """
+        Swap in a new set of categories.
+
+        Categories whose items are unchanged keep their shuffle position;
+        new or edited categories get a fresh shuffle (on their next pick),
+        and removed ones are dropped. The alias index is rebuilt afterwards.
+
+        Returns:
+            Names of the categories that were added or changed
+        """
+        new_variations = {k: list(v) for k, v in variations_map.items()}
+        changed = [k for k, v in new_variations.items() if self._variations.get(k) != v]
+        for key in list(self._state):
+            if key not in new_variations:
+                del self._state[key]
+        self._variations = new_variations
+        # Edited categories start a new bag the next time they're picked
+        for key in changed:
+            self._state.pop(key, None)
+        self._rebuild_aliases()
+        return changed
+
+    @property
+    def variations(self) -> Mapping[str, Sequence[str]]:
+        """The current categories and their items (don't modify)."""
+        return self._variations
+
+    def export_state(self, undealt: Iterable[Tuple[str, str]] = ()) -> Dict[str, Dict[str, object]]:
+        """
+        Bag order and position of every category, for saving to disk.
+
+        Each entry stores a hash of the category's items, the bag as indices
+        into the item list, and how far into the bag we are. Categories not
+        picked this session keep whatever state was restored for them.
+
+        Args:
+            undealt: (category, item) picks to save as still in their bags,
+                     e.g. ones dealt for messages that haven't been sent
+        """
+        exported: Dict[str, Dict[str, object]] = {
+            key: dict(saved) for key, saved in self._saved_state.items() if key in self._variations
+        }
+        returned: Dict[str, List[str]] = {}
+        for key, item in undealt:
+            returned.setdefault(key, []).append(item)
+        for key, bag in self._state.items():
+            items = self._variations[key]
+            randomized = list(bag.randomized)
+            i = bag.i
+            for item in returned.get(key, ()):
+                i = self._return_to_bag(randomized, i, item)
+            positions: Dict[str, List[int]] = {}
+            for idx, item in enumerate(items):
+                positions.setdefault(item, []).append(idx)
+            order = [positions[item].pop() for item in randomized]
+            exported[key] = {"hash": category_hash(items), "order": order, "i": i}
+        return exported
+
+    def restore_state(self, saved: Mapping[str, object]) -> None:
+        """
+        Remember bag state saved by export_state() in an earlier session.
+
+        Nothing is validated or rebuilt here; each category is restored on
+        its first pick, and only if its items still hash the same (an
+        edited category gets a fresh shuffle instead).
+        """
+        for key, entry in saved.items():
+            if isinstance(key, str) and isinstance(entry, dict):
+                self._saved_state[key] = entry
+
+    def _bag(self, key: str) -> ShuffleBag:
+        """The shuffle state of a category, creating or restoring it on first use."""
+        state = self._state.get(key)
+        if state is not None:
+            return state
+        saved = self._saved_state.pop(key, None)
+        if saved is not None:
+            items = self._variations[key]
+            order = saved.get("order")
+            i = saved.get("i")
+            if (
+                saved.get("hash") == category_hash(items)
+                and isinstance(order, list)
+                and sorted(order) == list(range(len(items)))
+                and isinstance(i, int)
+                and 0 <= i <= len(items)
+            ):
+                state = self._state[key] = ShuffleBag([items[j] for j in order], i)
+                return state
+        self._reshuffle(key, avoid_first=None)
+        return self._state[key]
+
+    def _rebuild_aliases(self) -> None:
+        """
+        Precompute every accepted spelling of every category name.
+
+        Two tables are built so a lookup is a single dict hit:
+            - _aliases: exact names, plus underscore/space swapped forms
+            - _folded_aliases: lowercase versions of all of the above
+
+        Exact names always win over swapped forms, and earlier categories
+        win over later ones when two spellings collide.
+        """
+        aliases: Dict[str, str] = {key: key for key in self._variations}
+        for key in self._variations:
+            aliases.setdefault(key.replace("_", " "), key)
+            aliases.setdefault(key.replace(" ", "_"), key)
+        folded: Dict[str, str] = {}
         for key in self._variations:
-            self._reshuffle(key, avoid_first=None)
+            folded.setdefault(key.lower(), key)
+        for alias, key in aliases.items():
+            folded.setdefault(alias.lower(), key)
+        self._aliases = aliases
+        self._folded_aliases = folded
+        self._known_keys = tuple(sorted(self._variations))
+
+    def alias_index(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """The alias tables, for saving in a compiled bundle."""
+        return dict(self._aliases), dict(self._folded_aliases)
 
     def _normalize_key(self, key: str) -> str:
         """
@@ -612,29 +944,30 @@ class VariationPicker:
         - Case-insensitive matching
         """
         key = key.strip()
-        if key in self._variations:
-            return key
-
-        # Try with underscores replaced by spaces
-        alt = key.replace("_", " ")
-        if alt in self._variations:
-            return alt
-
-        # Try with spaces replaced by underscores
-        alt2 = key.replace(" ", "_")
-        if alt2 in self._variations:
-            return alt2
-
-        # Case-insensitive fallback
-        key_lower = key.lower()
-        alt_lower = alt.lower()
-        alt2_lower = alt2.lower()
-        for existing_key in self._variations.keys():
-            existing_lower = existing_key.lower()
-            if existing_lower in (key_lower, alt_lower, alt2_lower):
-                return existing_key
-
-        raise KeyError(f'Unknown variation key "{key}". Known keys: {sorted(self._variations)}')
+        found = self._aliases.get(key)
+        if found is not None:
+            return found
+        found = self._folded_aliases.get(key.lower())
+        if found is not None:
+            return found
+        raise KeyError(self._unknown_key_message(key))
+
+    def _unknown_key_message(self, key: str) -> str:
+        """Build the error for an unknown key, suggesting likely matches."""
+        close = difflib.get_close_matches(key.lower(), self._folded_aliases, n=3, cutoff=0.6)
+        if close:
+            suggestions = sorted({self._folded_aliases[c] for c in close})
+            return f'Unknown variation key "{key}". Did you mean: {suggestions}?'
+        return f'Unknown variation key "{key}". Known keys: {list(self._known_keys)}'
+
+    def resolve_key(self, key: str) -> str:
+        """
+        Return the canonical category name for a (possibly sloppy) key.
+
+        Raises:
+            KeyError: If no category matches
+        """
+        return self._normalize_key(key)
 
     def _reshuffle(self, key: str, avoid_first: Optional[str]) -> None:
         """
@@ -647,26 +980,35 @@ class VariationPicker:
         """
         words = self._variations[key]
         if not words:
-            self._state[key] = {"randomized": [], "i": 0}
+            self._state[key] = ShuffleBag([])
             return
 
         # Try up to 30 times to get a shuffle that doesn't start with avoid_first
         for _ in range(30):
             randomized = sample(words, len(words))
             if avoid_first is None or randomized[0] != avoid_first:
-                self._state[key] = {"randomized": randomized, "i": 0}
+                self._state[key] = ShuffleBag(randomized)
                 return
 
         # Give up and accept whatever shuffle we get
-        self._state[key] = {"randomized": sample(words, len(words)), "i": 0}
+        self._state[key] = ShuffleBag(sample(words, len(words)))
 
-    def pick(self, key: str) -> str:
+    def pick(self, key: str, exclude: Optional[Callable[[str], bool]] = None) -> str:
         """
         Pick the next random item from a category.
 
+        Args:
+            key: The category to pick from
+            exclude: Optional predicate; items for which it returns True
+                     (e.g. messages still on cooldown) are skipped over.
+                     Skipped items stay in the bag for later.
+
         Returns:
             A string from the category, guaranteed not to be the same as
             the previous pick (unless the category has only 1-2 items).
+
+        Raises:
+            CategoryExhausted: If exclude rejects every item in the category
         """
         key = self._normalize_key(key)
 
@@ -676,25 +1018,97 @@ class VariationPicker:
         if len(words) < 3:
             print(f'Warning: variation list "{key}" has <3 items; repeats are likely.')
 
-        randomized = self._state[key]["randomized"]  # type: ignore[assignment]
-        i = int(self._state[key]["i"])  # type: ignore[arg-type]
+        state = self._bag(key)
+        randomized = state.randomized
+        i = state.i
 
         # If we've used all items, reshuffle
         if i >= len(randomized):
             avoid_first = randomized[-1] if randomized else None
             self._reshuffle(key, avoid_first=avoid_first)
-            randomized = self._state[key]["randomized"]  # type: ignore[assignment]
-            i = int(self._state[key]["i"])  # type: ignore[arg-type]
-
-        self._state[key]["i"] = i + 1
+            randomized = self._state[key].randomized
+            i = self._state[key].i
+
+        if exclude is not None:
+            j = self._find_eligible(randomized, i, exclude)
+            if j is None and i > 0:
+                # Nothing usable left in this bag; start a fresh one so items
+                # dealt earlier in the round get another chance.
+                self._reshuffle(key, avoid_first=randomized[i - 1])
+                randomized = self._state[key].randomized
+                i = 0
+                j = self._find_eligible(randomized, i, exclude)
+            if j is None:
+                raise CategoryExhausted(key, len(words))
+            # Deal the eligible item now; the skipped one takes its place
+            randomized[i], randomized[j] = randomized[j], randomized[i]
+
+        self._state[key].i = i + 1
         return str(randomized[i])
 
+    def undeal(self, key: str, item: str) -> None:
+        """
+        Put a picked item back into its bag, to be dealt next.
+
+        For picks that were never used (e.g. a pre-rendered message that
+        was thrown away). Ignored if the category or its bag has changed
+        since the item was dealt.
+        """
+        state = self._state.get(key)
+        if state is None:
+            return
+        state.i = self._return_to_bag(state.randomized, state.i, item)
+
+    @staticmethod
+    def _return_to_bag(randomized: List[str], i: int, item: str) -> int:
+        """Move a dealt item to the front of the undealt part; returns the new position."""
+        for j in range(i - 1, -1, -1):
+            if randomized[j] == item:
+                randomized[j], randomized[i - 1] = randomized[i - 1], randomized[j]
+                return i - 1
+        return i
+
+    @staticmethod
+    def _find_eligible(randomized: List[str], start: int, exclude: Callable[[str], bool]) -> Optional[int]:
+        """Index of the first item at or after start that isn't excluded."""
+        for j in range(start, len(randomized)):
+            if not exclude(randomized[j]):
+                return j
+        return None
+
 
 # =============================================================================
 # TEXT PROCESSING
 # =============================================================================
 
 
+TEXT_MODIFIERS: Mapping[str, Callable[[str], str]] = {
+    "lower": str.lower,
+    "upper": str.upper,
+    "capitalize": str.capitalize,
+    "title": str.title,
+}
+
+
+def resolve_text_modifier(modifier: Optional[str]) -> Optional[Callable[[str], str]]:
+    """
+    Look up the function for a template modifier name.
+
+    Returns:
+        The transform function, or None if no modifier was given
+
+    Raises:
+        ValueError: If the modifier name is not supported
+    """
+    if not modifier:
+        return None
+    name = modifier.strip().lower()
+    try:
+        return TEXT_MODIFIERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown text modifier: {name}") from None
+
+
 def apply_text_modifier(text: str, modifier: Optional[str]) -> str:
     """
     Apply a text transformation (used in template syntax like {key:lower}).
@@ -705,61 +1119,205 @@ def apply_text_modifier(text: str, modifier: Optional[str]) -> str:
         - capitalize: Capitalize first letter only
         - title: Title Case Every Word
     """
-    if not modifier:
-        return text
-    modifier = modifier.strip().lower()
-    if modifier == "lower":
-        return text.lower()
-    if modifier == "upper":
-        return text.upper()
-    if modifier == "capitalize":
-        return text.capitalize()
-    if modifier == "title":
-        return text.title()
-    raise ValueError(f"Unknown text modifier: {modifier}")
+    transform = resolve_text_modifier(modifier)
+    return transform(text) if transform else text
 
 
-def render_template(template: str, pick_variation: Callable[[str], str]) -> str:
+class TemplateSlot(NamedTuple):
+    """A {category:modifier} placeholder in a compiled template."""
+    key: str
+    transform: Optional[Callable[[str], str]]
+    modifier: Optional[str] = None  # Modifier name, e.g. "upper"
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
     """
-    Render a template string by substituting {category} placeholders.
+    A template parsed once into literal strings and placeholder slots.
 
-    Examples:
-        "Hello {friend}" -> "Hello ole Buddy."
-        "{compliment:lower}" -> "great!"
-        "Nice one, {friend:upper}" -> "Nice one, OLE BUDDY."
+    Rendering is then just a join over the prebuilt parts - no scanning
+    for braces or splitting tokens on every send.
+
+    Attributes:
+        source: The original template string
+        parts: Literal strings and TemplateSlot entries, in order
+    """
+    source: str
+    parts: Tuple[Union[str, TemplateSlot], ...]
+
+    @property
+    def slots(self) -> Tuple[TemplateSlot, ...]:
+        """Just the placeholder slots, in order."""
+        return tuple(p for p in self.parts if isinstance(p, TemplateSlot))
+
+    def render(self, pick_variation: Callable[[str], str]) -> str:
+        """Render the template, calling pick_variation once per slot."""
+        out: List[str] = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            text = pick_variation(part.key)
+            out.append(part.transform(text) if part.transform else text)
+        return "".join(out)
+
+    def render_split(self, pick_variation: Callable[[str], str]) -> Tuple[str, Optional[TemplateSlot], str]:
+        """
+        Render everything except the last slot.
+
+        This lets the caller choose the last slot's value itself (for
+        example, skipping values that would produce a message that's on
+        cooldown) and then finish the message as prefix + value + suffix.
+
+        Returns:
+            (prefix, last_slot, suffix); last_slot is None if the template
+            has no placeholders, in which case prefix is the whole text.
+        """
+        last = -1
+        for idx, part in enumerate(self.parts):
+            if isinstance(part, TemplateSlot):
+                last = idx
+        if last == -1:
+            return "".join(self.parts), None, ""  # type: ignore[arg-type]
+        prefix = CompiledTemplate(self.source, self.parts[:last]).render(pick_variation)
+        suffix = "".join(self.parts[last + 1 :])  # type: ignore[arg-type]
+        return prefix, self.parts[last], suffix  # type: ignore[return-value]
+
+
+def compile_template(template: str, resolve_key: Optional[Callable[[str], str]] = None) -> CompiledTemplate:
+    """
+    Parse a template string into a CompiledTemplate.
 
     Args:
         template: The template string with {placeholders}
-        pick_variation: Function that returns a random item for a category
-
-    Returns:
-        The fully rendered string with all placeholders replaced
+        resolve_key: Optional function mapping a placeholder name to its
+                     canonical category name (e.g. "cat_fact" -> "cat fact").
+                     Resolving here means unknown categories are reported
+                     when the template is compiled rather than mid-match.
+
+    Raises:
+        KeyError: If resolve_key rejects a category name
+        ValueError: If a placeholder uses an unknown modifier
     """
-    out: List[str] = []
+    parts: List[Union[str, TemplateSlot]] = []
+    literal: List[str] = []
     i = 0
     while i < len(template):
-        if template[i] != "{":
-            out.append(template[i])
-            i += 1
-            continue
+        start = template.find("{", i)
+        if start == -1:
+            literal.append(template[i:])
+            break
+        literal.append(template[i:start])
 
-        end = template.find("}", i + 1)
+        end = template.find("}", start + 1)
         if end == -1:
             # Unclosed brace, just output the rest as-is
-            out.append(template[i:])
+            literal.append(template[start:])
             break
 
-        token = template[i + 1 : end].strip()
+        token = template[start + 1 : end].strip()
         if ":" in token:
             key, modifier = token.split(":", 1)
         else:
             key, modifier = token, None
-
-        replacement = pick_variation(key.strip())
-        out.append(apply_text_modifier(replacement, modifier))
+        key = key.strip()
+        if resolve_key is not None:
+            key = resolve_key(key)
+
+        if literal:
+            text = "".join(literal)
+            if text:
+                parts.append(text)
+            literal = []
+        transform = resolve_text_modifier(modifier)
+        parts.append(TemplateSlot(key, transform, modifier.strip().lower() if transform and modifier else None))
         i = end + 1
 
-    return "".join(out)
+    text = "".join(literal)
+    if text:
+        parts.append(text)
+    return CompiledTemplate(source=template, parts=tuple(parts))
+
+
+class TemplateCache:
+    """
+    Bounded cache of compiled templates, keyed by template string.
+
+    Least recently used templates are evicted once max_entries is reached,
+    so dynamically composed templates can't grow the cache forever.
+    """
+
+    def __init__(
+        self,
+        resolve_key: Optional[Callable[[str], str]] = None,
+        max_entries: int = 512,
+    ) -> None:
+        self._resolve_key = resolve_key
+        self._max_entries = max(1, max_entries)
+        self._compiled: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._compiled)
+
+    def get(self, template: str) -> CompiledTemplate:
+        """Return the compiled form of a template, compiling it on first use."""
+        compiled = self._compiled.get(template)
+        if compiled is not None:
+            self._compiled.move_to_end(template)
+            return compiled
+        compiled = compile_template(template, self._resolve_key)
+        self._compiled[template] = compiled
+        if len(self._compiled) > self._max_entries:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def clear(self) -> None:
+        """Forget every compiled template (e.g. after the corpus changes)."""
+        self._compiled.clear()
+
+    def seed(self, compiled: Mapping[str, CompiledTemplate]) -> None:
+        """Add templates that were already compiled elsewhere."""
+        for template, entry in compiled.items():
+            self._compiled[template] = entry
+        while len(self._compiled) > self._max_entries:
+            self._compiled.popitem(last=False)
+
+
+_render_cache = TemplateCache()
+
+
+def render_template(template: str, pick_variation: Callable[[str], str]) -> str:
+    """
+    Render a template string by substituting {category} placeholders.
+
+    Examples:
+        "Hello {friend}" -> "Hello ole Buddy."
+        "{compliment:lower}" -> "great!"
+        "Nice one, {friend:upper}" -> "Nice one, OLE BUDDY."
+
+    Args:
+        template: The template string with {placeholders}
+        pick_variation: Function that returns a random item for a category
+
+    Returns:
+        The fully rendered string with all placeholders replaced
+    """
+    return _render_cache.get(template).render(pick_variation)
+
+
+# "Smart" punctuation and its plain ASCII equivalent. Built once at import.
+_ASCII_TRANSLATION = str.maketrans(
+    {
+        "\u2018": "'",      # Smart single quote (left)
+        "\u2019": "'",      # Smart single quote (right)
+        "\u201c": '"',      # Smart double quote (left)
+        "\u201d": '"',      # Smart double quote (right)
+        "\u2013": "-",      # En-dash
+        "\u2014": "-",      # Em-dash
+        "\u2026": "...",    # Ellipsis
+        "\u00a0": " ",      # Non-breaking space
+    }
+)
 
 
 def normalize_ascii(text: str) -> str:
@@ -769,207 +1327,2219 @@ def normalize_ascii(text: str) -> str:
     This is useful because some terminal/chat systems don't handle Unicode
     well. Smart quotes become regular quotes, em-dashes become hyphens, etc.
     """
+    if text.isascii():
+        return text
     # First, replace common "smart" characters with ASCII equivalents
-    table = str.maketrans(
-        {
-            "'": "'",      # Smart single quote (left)
-            "'": "'",      # Smart single quote (right)
-            """: '"',      # Smart double quote (left)
-            """: '"',      # Smart double quote (right)
-            "–": "-",      # En-dash
-            "—": "-",      # Em-dash
-            "…": "...",    # Ellipsis
-            "\u00a0": " ", # Non-breaking space
-        }
-    )
-    text = text.translate(table)
+    text = text.translate(_ASCII_TRANSLATION)
 
     # Then normalize Unicode and strip anything that's still not ASCII
     text = unicodedata.normalize("NFKD", text)
     return text.encode("ascii", "ignore").decode("ascii")
 
 
-# =============================================================================
-# CHAT SENDING
-# =============================================================================
+def ascii_lost_chars(text: str) -> List[str]:
+    """Characters of `text` that normalize_ascii drops entirely (emoji, CJK, ...)."""
+    return sorted({c for c in text if not c.isascii() and not normalize_ascii(c)})
 
 
-def send_chat(message: str, settings: ChatSettings, spam_count: int = 1) -> None:
+class AsciiCache:
     """
-    Send a chat message in Rocket League via simulated keyboard input.
-
-    This opens chat with the appropriate key, types the message, and hits enter.
+    ASCII forms of messages, computed once per distinct source string.
 
-    Args:
-        message: The message to send
-        settings: Chat configuration (mode, keys, timing)
-        spam_count: How many times to send the message (default 1)
+    prime() normalizes every variation up front when the corpus is loaded
+    (or reloaded); those entries are kept for good. Anything else - text
+    composed from templates, modifiers applied - is normalized on first
+    use and kept in a bounded LRU.
     """
-    if settings.chat_mode not in settings.chat_keys:
-        raise KeyError(f'Unknown chat mode "{settings.chat_mode}". Known: {sorted(settings.chat_keys)}')
 
-    for _ in range(spam_count):
-        if settings.dry_run:
-            # Just print instead of actually sending
-            print(f"[dry-run] {message}")
-        else:
-            import pyautogui
+    def __init__(self, max_entries: int = 4096) -> None:
+        self._corpus: Dict[str, str] = {}
+        self._composed: "OrderedDict[str, str]" = OrderedDict()
+        self._max_entries = max(1, max_entries)
+
+    def __len__(self) -> int:
+        return len(self._corpus) + len(self._composed)
 
-            # Open chat with the appropriate key
-            pyautogui.press(settings.chat_keys[settings.chat_mode])
-            # Type the message
-            pyautogui.write(message, interval=settings.typing_interval_s)
-            # Send it
-            pyautogui.press("enter")
-        time.sleep(settings.chat_spam_interval_s)
+    def prime(self, variations_map: Mapping[str, Sequence[str]]) -> List[str]:
+        """
+        Normalize every message of the given categories.
+
+        Returns:
+            A warning for each message that comes out empty or loses
+            characters (so its meaning may change) when made ASCII
+        """
+        problems: List[str] = []
+        for key, items in variations_map.items():
+            for item in items:
+                converted = normalize_ascii(item)
+                self._corpus[item] = converted
+                if converted is item:
+                    continue
+                if item.strip() and not converted.strip():
+                    problems.append(f'"{key}": {item!r} is empty in ASCII')
+                else:
+                    lost = ascii_lost_chars(item)
+                    if lost:
+                        problems.append(f'"{key}": {item!r} loses {" ".join(lost)} in ASCII -> {converted!r}')
+        return problems
+
+    def get(self, text: str) -> str:
+        """The ASCII form of a message."""
+        converted = self._corpus.get(text)
+        if converted is not None:
+            return converted
+        converted = self._composed.get(text)
+        if converted is not None:
+            self._composed.move_to_end(text)
+            return converted
+        converted = normalize_ascii(text)
+        self._composed[text] = converted
+        if len(self._composed) > self._max_entries:
+            self._composed.popitem(last=False)
+        return converted
 
 
 # =============================================================================
-# D-PAD HANDLING
+# LATENCY STATS
+# =============================================================================
+# Optional timing of every stage between a button press and the text showing
+# up in chat. Each stage gets a fixed-bucket histogram (no per-sample storage,
+# so hours of play cost the same memory as a few seconds).
+#
+# Stats are off unless --stats is given. Instrumented code checks the
+# module-level STATS once and skips all timing when it's None, so the cost
+# when disabled is one global lookup per stage.
 # =============================================================================
 
+# Bucket upper bounds in seconds (50 us .. 1 s); anything slower lands in a
+# final overflow bucket.
+LATENCY_BUCKETS_S: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0,
+)
 
-def hat_to_dpad_action(value: Tuple[int, int]) -> Optional[str]:
-    """
-    Convert a "hat" (D-pad) value from pygame to a direction string.
 
-    Pygame represents D-pad as a tuple of (x, y) where:
-        - x: -1 = left, 0 = center, 1 = right
-        - y: -1 = down, 0 = center, 1 = up
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations (in seconds)."""
 
-    Returns:
-        "up", "down", "left", "right", or None if centered
-    """
-    x, y = value
-    if x == 0 and y == 0:
-        return None
-    if y == 1:
-        return "up"
-    if y == -1:
-        return "down"
-    if x == -1:
-        return "left"
-    if x == 1:
-        return "right"
-    return None
+    __slots__ = ("counts", "count", "total_s", "max_s")
 
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_S) + 1)
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
 
-# =============================================================================
-# MACRO ENGINE
-# =============================================================================
+    def record(self, seconds: float) -> None:
+        """Add one sample."""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_S, seconds)] += 1
+        self.count += 1
+        self.total_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
 
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th percentile (0 < q <= 1).
 
-@dataclass(frozen=True)
-class MacroSettings:
+        Samples in the overflow bucket report the max seen instead.
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for idx, n in enumerate(self.counts):
+            running += n
+            if running >= target:
+                if idx < len(LATENCY_BUCKETS_S):
+                    return min(LATENCY_BUCKETS_S[idx], self.max_s)
+                break
+        return self.max_s
+
+
+class LatencyStats:
     """
-    Configuration for the macro input detection.
+    Per-stage latency histograms, safe to record into from any thread.
 
-    Attributes:
-        macro_window_s: Maximum time between first and second D-pad press
-                       to register as a combo (default 1.1 seconds)
-        macro_min_gap_s: Minimum time between presses (filters out bouncing)
+    Stage names are free-form; histograms are created on first use and
+    reported in the order stages were first seen.
     """
-    macro_window_s: float = 1.1
-    macro_min_gap_s: float = 0.05
 
+    def __init__(self) -> None:
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Add one duration sample to a stage."""
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = LatencyHistogram()
+            hist.record(seconds)
+
+    def histogram(self, stage: str) -> Optional[LatencyHistogram]:
+        """The histogram for a stage, or None if nothing was recorded."""
+        return self._histograms.get(stage)
+
+    def report(self) -> str:
+        """Table of every stage (count, avg, p50/p90/p99 bucket, max)."""
+        with self._lock:
+            items = list(self._histograms.items())
+        if not items:
+            return "Latency stats: nothing recorded yet"
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000.0:.3f}"
+
+        lines = [
+            "Latency stats (ms; percentiles are bucket upper bounds):",
+            f"  {'stage':<20} {'count':>7} {'avg':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}",
+        ]
+        for stage, hist in items:
+            avg = hist.total_s / hist.count if hist.count else 0.0
+            lines.append(
+                f"  {stage:<20} {hist.count:>7} {ms(avg):>9} {ms(hist.percentile(0.5)):>9} "
+                f"{ms(hist.percentile(0.9)):>9} {ms(hist.percentile(0.99)):>9} {ms(hist.max_s):>9}"
+            )
+        return "\n".join(lines)
 
-class MacroEngine:
-    """
-    The main engine that processes D-pad inputs and triggers quickchats.
 
-    Listens for D-pad direction sequences (e.g., UP + UP, LEFT + RIGHT)
-    and sends the corresponding quickchat message when a combo is detected.
+# Global stats sink; None means instrumentation is disabled.
+STATS: Optional[LatencyStats] = None
 
-    Features:
-        - Two-input combo detection with configurable timing window
-        - Automatic message variation to avoid repetition
-        - Cooldown system to prevent spam of identical messages
-        - Persistent state across restarts (optional)
-        - Toggle on/off with PS button
-    """
 
-    def __init__(
-        self,
-        variation_picker: VariationPicker,
-        chat_settings: ChatSettings,
-        macro_settings: MacroSettings,
-        message_cooldown_s: float,
-        ascii_only: bool,
-        persist_path: Optional[str],
-    ) -> None:
-        self._variation_picker = variation_picker
-        self._chat_settings = chat_settings
-        self._macro_settings = macro_settings
-        self._recent = RecentMessageCache(cooldown_s=message_cooldown_s)
-        self._ascii_only = ascii_only
-        self._persist_path = persist_path
-        self._macros_enabled = True
+def enable_stats() -> LatencyStats:
+    """Turn on latency instrumentation (idempotent) and return the sink."""
+    global STATS
+    if STATS is None:
+        STATS = LatencyStats()
+    return STATS
 
-        # Input tracking state
-        self._last_action: Optional[str] = None
-        self._last_action_time: float = 0.0
-        self._last_sent_message: str = ""
-        self._last_toggle_time: float = 0.0
-
-        # =====================================================================
-        # MACRO DEFINITIONS
-        # =====================================================================
-        # Each tuple (direction1, direction2) maps to a template string.
-        # Templates can be plain text or include {category} placeholders.
-        # =====================================================================
-
-        self._macros: Dict[Tuple[str, str], str] = {
-            # Callouts
-            ("up", "up"):       "{I Got It}",           # I got it!
-            ("up", "down"):     "{Defending}",          # Defending...
-            ("up", "left"):     "{Need Boost}",         # Need boost!
-            ("right", "up"):    "{Centering}",          # Centering!
-
-            # Positive reactions
-            ("left", "up"):     "{Nice One}",           # Nice shot/pass!
-            ("left", "right"):  "{Thanks}",             # Thanks!
-            ("left", "down"):   "{Celebration}",        # Let's go!
-            ("left", "left"):   "{compliment}",         # Quick compliment
-            ("right", "left"):  "{compliment}",         # Quick compliment (alt)
-
-            # Morale
-            ("up", "right"):    "{Confidence Boost}",   # We got this!
-            ("down", "up"):     "{Greeting}",           # Hello!
-
-            # Responses
-            ("down", "right"):  "{No Problem}",         # No problem (sarcastic)
-            ("down", "left"):   "{Apology}",            # Sorry!
-
-            # Taunts & Challenges
-            ("right", "right"): "{Encouraging Taunt}",  # Nice try!
-            ("right", "down"):  "{Challenge}",          # Fight me!
-
-            # The best feature
-            ("down", "down"):   "{cat fact}",           # CAT FAX!
-        }
 
-        # Try to restore state from previous session
-        self._load_persisted_state()
+def install_stats_signal() -> threading.Event:
+    """
+    Let the user ask for a stats report while the script is running.
 
-    def _load_persisted_state(self) -> None:
-        """
-        Load previously saved state (cooldown history, last message).
+    Ctrl+Break (Windows) or SIGUSR1 (Linux/macOS) sets the returned event;
+    the main loop prints the report the next time it wakes up.
+    """
+    requested = threading.Event()
+    signum = getattr(signal, "SIGBREAK", None) or getattr(signal, "SIGUSR1", None)
+    if signum is not None:
+        try:
+            signal.signal(signum, lambda *_: requested.set())
+        except (ValueError, OSError):
+            pass  # Not on the main thread, or not supported here
+    return requested
 
-        This allows the cooldown system to work across restarts -
-        you won't immediately repeat a message you just sent before
-        restarting the script.
+
+# =============================================================================
+# CHAT SENDING
+# =============================================================================
+# Keystrokes are delivered by a pluggable backend:
+#
+#   - pyautogui: opens chat, types the message one key at a time, hits enter.
+#     pyautogui's built-in pause after *every* call is turned off; instead
+#     there's a short explicit wait after opening chat so the chat box is
+#     ready before typing starts.
+#   - clipboard: opens chat, pastes the whole message with Ctrl+V, hits enter.
+#     Much faster for long messages (overwrites whatever is on your clipboard).
+#   - dry-run: prints the message instead of typing it.
+#   - memory: keeps delivered messages in a list (for tests and benchmarks).
+#
+# Delivery can be cancelled part way (a more urgent callout, or macros being
+# toggled off): backends check a cancel Event between small chunks of work,
+# and on cancel close the chat box with Escape so no half sentence is left in
+# it, then raise DeliveryCancelled.
+# =============================================================================
+
+
+class DeliveryCancelled(Exception):
+    """Raised by a backend when a delivery was cancelled part way."""
+
+
+class ChatBackend:
+    """
+    Base class for keystroke-delivery backends.
+
+    Subclasses implement deliver(); warm() is optional and lets slow imports
+    or setup happen at startup instead of on the first quickchat.
+    """
+
+    name = "base"
+
+    def warm(self) -> None:
+        """Do any slow one-time setup ahead of the first message."""
+
+    def deliver(self, message: str, chat_key: str, cancel: Optional[threading.Event] = None) -> None:
+        """
+        Open chat with chat_key, enter the message, and send it.
+
+        Raises:
+            DeliveryCancelled: If `cancel` got set before the message was
+                               sent (the chat box is closed again)
+        """
+        raise NotImplementedError
+
+
+class PyAutoGuiBackend(ChatBackend):
+    """Types messages key by key with pyautogui."""
+
+    name = "pyautogui"
+
+    # Characters typed between checks for cancellation. pyautogui takes a
+    # millisecond or two per key, so a cancel lands within a few ms.
+    chunk_chars = 4
+
+    def __init__(self, typing_interval_s: float = 0.001, chat_open_delay_s: float = 0.05) -> None:
+        self.typing_interval_s = typing_interval_s
+        self.chat_open_delay_s = chat_open_delay_s
+        self._pyautogui = None
+
+    def _load(self):  # type: ignore[no-untyped-def]
+        if self._pyautogui is None:
+            import pyautogui
+
+            # pyautogui sleeps 0.1 s after every call by default; the only
+            # pause we actually need is after opening chat.
+            pyautogui.PAUSE = 0.0
+            self._pyautogui = pyautogui
+        return self._pyautogui
+
+    def warm(self) -> None:
+        self._load()
+
+    def _wait(self, seconds: float, cancel: Optional[threading.Event]) -> None:
+        """Sleep, waking up early (and aborting) if cancelled."""
+        if cancel is None:
+            time.sleep(seconds)
+        elif cancel.wait(seconds):
+            self._abort()
+
+    def _check(self, cancel: Optional[threading.Event]) -> None:
+        if cancel is not None and cancel.is_set():
+            self._abort()
+
+    def _abort(self) -> None:
+        """Close the chat box, discarding what was typed, and bail out."""
+        self._load().press("escape")
+        raise DeliveryCancelled()
+
+    def deliver(self, message: str, chat_key: str, cancel: Optional[threading.Event] = None) -> None:
+        pyautogui = self._load()
+        stats = STATS
+        t0 = time.perf_counter()
+        # Open chat with the appropriate key
+        pyautogui.press(chat_key)
+        self._wait(self.chat_open_delay_s, cancel)
+        t1 = time.perf_counter()
+        # Type the message, a few keys at a time so it can be cancelled
+        if cancel is None:
+            pyautogui.write(message, interval=self.typing_interval_s)
+        else:
+            for i in range(0, len(message), self.chunk_chars):
+                self._check(cancel)
+                pyautogui.write(message[i:i + self.chunk_chars], interval=self.typing_interval_s)
+            self._check(cancel)
+        t2 = time.perf_counter()
+        # Send it
+        pyautogui.press("enter")
+        if stats is not None:
+            t3 = time.perf_counter()
+            stats.record("press_chat_key", t1 - t0)
+            stats.record("write", t2 - t1)
+            stats.record("press_enter", t3 - t2)
+
+
+class ClipboardBackend(PyAutoGuiBackend):
+    """Pastes the whole message at once via the clipboard."""
+
+    name = "clipboard"
+
+    def __init__(self, chat_open_delay_s: float = 0.05) -> None:
+        super().__init__(chat_open_delay_s=chat_open_delay_s)
+        self._pyperclip = None
+        self._paste_keys = ("command", "v") if sys.platform == "darwin" else ("ctrl", "v")
+
+    def warm(self) -> None:
+        super().warm()
+        if self._pyperclip is None:
+            import pyperclip  # Installed alongside pyautogui
+
+            self._pyperclip = pyperclip
+
+    def deliver(self, message: str, chat_key: str, cancel: Optional[threading.Event] = None) -> None:
+        pyautogui = self._load()
+        self.warm()
+        stats = STATS
+        t0 = time.perf_counter()
+        pyautogui.press(chat_key)
+        self._pyperclip.copy(message)  # type: ignore[attr-defined]
+        self._wait(self.chat_open_delay_s, cancel)
+        t1 = time.perf_counter()
+        pyautogui.hotkey(*self._paste_keys)
+        self._check(cancel)
+        t2 = time.perf_counter()
+        pyautogui.press("enter")
+        if stats is not None:
+            t3 = time.perf_counter()
+            stats.record("press_chat_key", t1 - t0)
+            stats.record("paste", t2 - t1)
+            stats.record("press_enter", t3 - t2)
+
+
+class DryRunBackend(ChatBackend):
+    """Prints messages instead of typing them."""
+
+    name = "dry-run"
+
+    def deliver(self, message: str, chat_key: str, cancel: Optional[threading.Event] = None) -> None:
+        if cancel is not None and cancel.is_set():
+            raise DeliveryCancelled()
+        print(f"[dry-run] {message}")
+
+
+class MemoryBackend(ChatBackend):
+    """Collects (chat_key, message) pairs in a list instead of typing them."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.delivered: List[Tuple[str, str]] = []
+
+    def deliver(self, message: str, chat_key: str, cancel: Optional[threading.Event] = None) -> None:
+        if cancel is not None and cancel.is_set():
+            raise DeliveryCancelled()
+        self.delivered.append((chat_key, message))
+
+
+CHAT_BACKENDS: Tuple[str, ...] = ("pyautogui", "clipboard", "dry-run", "memory")
+
+
+def make_backend(settings: ChatSettings) -> ChatBackend:
+    """
+    Create the backend selected in the chat settings.
+
+    dry_run=True always wins, so --dry-run is safe with any --backend.
+    """
+    name = "dry-run" if settings.dry_run else settings.backend
+    if name == "pyautogui":
+        return PyAutoGuiBackend(settings.typing_interval_s, settings.chat_open_delay_s)
+    if name == "clipboard":
+        return ClipboardBackend(settings.chat_open_delay_s)
+    if name == "dry-run":
+        return DryRunBackend()
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f'Unknown chat backend "{name}". Known: {list(CHAT_BACKENDS)}')
+
+
+def send_chat(
+    message: str,
+    settings: ChatSettings,
+    spam_count: int = 1,
+    backend: Optional[ChatBackend] = None,
+    pace: bool = True,
+    cancel: Optional[threading.Event] = None,
+) -> None:
+    """
+    Send a chat message in Rocket League via simulated keyboard input.
+
+    This opens chat with the appropriate key, types the message, and hits enter.
+
+    Args:
+        message: The message to send
+        settings: Chat configuration (mode, keys, timing)
+        spam_count: How many times to send the message (default 1)
+        backend: Keystroke backend; defaults to the one in settings
+        pace: Sleep the spam interval after the last send too. The
+              background sender turns this off and spaces messages with
+              its rate limiter instead.
+        cancel: Set this Event to abort the delivery part way
+
+    Raises:
+        DeliveryCancelled: If `cancel` was set before the message was sent
+    """
+    if settings.chat_mode not in settings.chat_keys:
+        raise KeyError(f'Unknown chat mode "{settings.chat_mode}". Known: {sorted(settings.chat_keys)}')
+
+    if backend is None:
+        backend = make_backend(settings)
+    chat_key = settings.chat_keys[settings.chat_mode]
+    for i in range(spam_count):
+        backend.deliver(message, chat_key, cancel)
+        if pace or i + 1 < spam_count:
+            time.sleep(settings.chat_spam_interval_s)
+
+
+# =============================================================================
+# BACKGROUND SENDER
+# =============================================================================
+# Typing a long message takes a noticeable amount of time (one keystroke per
+# character, plus the spam interval). If that happens inside the pygame loop,
+# controller events pile up unhandled and combos get lost. The sender moves
+# delivery onto a worker thread with a small bounded queue, so the event loop
+# keeps reading input at full rate while messages are typed out.
+#
+# Rocket League throttles players who chat too fast, so the sender paces
+# messages with a token bucket: a short burst goes out immediately, then
+# messages are spaced at the refill rate. Each queued message also has a
+# time-to-live - a "Defending!" that would go out 4 seconds late is dropped
+# rather than sent.
+# =============================================================================
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    The bucket holds up to `burst` tokens and refills at `rate_per_s`
+    tokens per second. Each message costs one token. Consecutive messages
+    are also kept at least `min_interval_s` apart, so the game has time to
+    close the chat box before the next one opens it.
+
+    Not thread-safe; the sender's worker thread is its only user.
+    """
+
+    def __init__(
+        self,
+        rate_per_s: float,
+        burst: int,
+        min_interval_s: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate_per_s <= 0:
+            raise ValueError("rate_per_s must be positive")
+        self.rate_per_s = rate_per_s
+        self.burst = max(1, burst)
+        self.min_interval_s = max(0.0, min_interval_s)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._last_take: Optional[float] = None
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate_per_s)
+            self._updated = now
+
+    def delay(self) -> float:
+        """Seconds until a message may be sent (0.0 if it may go now)."""
+        now = self._clock()
+        self._refill(now)
+        wait = 0.0
+        if self._last_take is not None:
+            wait = self._last_take + self.min_interval_s - now
+        if self._tokens < 1.0:
+            wait = max(wait, (1.0 - self._tokens) / self.rate_per_s)
+        return max(0.0, wait)
+
+    def take(self) -> None:
+        """Spend a token (call once delay() has reached zero)."""
+        now = self._clock()
+        self._refill(now)
+        self._tokens -= 1.0
+        self._last_take = now
+
+
+class PendingChat(NamedTuple):
+    """A message waiting in the sender's queue."""
+    message: str
+    queued_at: float  # time.perf_counter() when submitted
+    chat_mode: Optional[str]
+    priority: int
+    key: Optional[str]  # messages with the same key and chat mode are coalesced
+    tag: object = None  # handed back to ChatSender.on_done
+
+
+class SendScheduler:
+    """
+    Bounded priority queue of pending chats.
+
+    Higher priority messages are popped first, equal priorities in the
+    order they were submitted. Pushing a message whose key is already
+    pending for the same chat mode coalesces it into that one. When full, a new message evicts the
+    newest of the lowest priority pending messages - if that is lower than
+    its own priority; otherwise it's rejected.
+
+    The queue is a handful of entries, so eviction and coalescing simply
+    scan it.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max(1, max_size)
+        self._heap: List[Tuple[int, int, PendingChat]] = []
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: PendingChat) -> Tuple[str, Optional[PendingChat]]:
+        """
+        Add a message.
+
+        Returns:
+            (outcome, evicted): outcome is "queued", "coalesced" or "full";
+            evicted is the message pushed out to make room, if any
+        """
+        with self._cond:
+            if item.key is not None and any(
+                entry[2].key == item.key and entry[2].chat_mode == item.chat_mode for entry in self._heap
+            ):
+                return "coalesced", None
+            evicted = None
+            if len(self._heap) >= self._max_size:
+                victim = max(self._heap)  # lowest priority, newest
+                if victim[2].priority >= item.priority:
+                    return "full", None
+                self._heap.remove(victim)
+                heapq.heapify(self._heap)
+                evicted = victim[2]
+            self._seq += 1
+            heapq.heappush(self._heap, (-item.priority, self._seq, item))
+            self._cond.notify()
+            return "queued", evicted
+
+    def wait(self) -> bool:
+        """Wait until a message is pending; False once closed and empty."""
+        with self._cond:
+            while not self._heap:
+                if self._closed:
+                    return False
+                self._cond.wait()
+            return True
+
+    def pop(self) -> Optional[PendingChat]:
+        """Take the most urgent message (None if nothing is pending)."""
+        with self._cond:
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def clear(self) -> List[PendingChat]:
+        """Discard every pending message (returned, most urgent first)."""
+        with self._cond:
+            items = [entry[2] for entry in sorted(self._heap)]
+            self._heap.clear()
+            return items
+
+    def close(self) -> None:
+        """Let pop() return None once the queue is empty."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self) -> None:
+        """Undo close() (the sender can be restarted)."""
+        with self._cond:
+            self._closed = False
+
+
+@dataclass
+class SenderStats:
+    """
+    Counters reported by the background sender.
+
+    Attributes:
+        sent: Messages delivered successfully
+        failed: Messages whose delivery raised an error
+        dropped_full: Messages rejected because the queue was full
+        max_depth: Deepest the queue got (including the new message)
+        total_wait_s: Sum of time messages spent queued before delivery
+        max_wait_s: Longest time a single message spent queued
+        dropped_stale: Messages dropped because they outlived their TTL
+        coalesced: Repeat triggers merged into a message already queued
+        preempted: Queued messages pushed out by a higher priority one
+        cancelled: Messages aborted part way through typing
+        throttled: Messages held back by the rate limiter
+        total_throttle_s: Sum of time messages were held by the limiter
+        max_throttle_s: Longest time a single message was held
+    """
+    sent: int = 0
+    failed: int = 0
+    dropped_full: int = 0
+    max_depth: int = 0
+    total_wait_s: float = 0.0
+    max_wait_s: float = 0.0
+    dropped_stale: int = 0
+    coalesced: int = 0
+    preempted: int = 0
+    cancelled: int = 0
+    throttled: int = 0
+    total_throttle_s: float = 0.0
+    max_throttle_s: float = 0.0
+
+    def summary(self) -> str:
+        """One-line human readable summary (printed on exit)."""
+        delivered = self.sent + self.failed
+        avg_ms = (self.total_wait_s / delivered * 1000.0) if delivered else 0.0
+        throttle_ms = (self.total_throttle_s / self.throttled * 1000.0) if self.throttled else 0.0
+        return (
+            f"sent={self.sent} failed={self.failed} dropped(queue full)={self.dropped_full} "
+            f"dropped(stale)={self.dropped_stale} dropped(preempted)={self.preempted} "
+            f"cancelled={self.cancelled} coalesced={self.coalesced} max queue depth={self.max_depth} "
+            f"wait avg={avg_ms:.1f} ms max={self.max_wait_s * 1000.0:.1f} ms "
+            f"throttled={self.throttled} (avg {throttle_ms:.0f} ms, max {self.max_throttle_s * 1000.0:.0f} ms)"
+        )
+
+
+class ChatSender:
+    """
+    Delivers chat messages from a worker thread.
+
+    The engine calls submit() which only enqueues the message and returns
+    immediately. The worker thread pops messages by priority (time-critical
+    callouts before jokes; see category_priorities) and sends them with
+    send_chat() through the configured keystroke backend.
+
+    The queue is bounded on purpose: if messages are being triggered faster
+    than they can be typed, it's better to drop the extras than to keep
+    typing stale callouts for the next 30 seconds. For the same reason a
+    message that has waited longer than its TTL (queue time plus rate
+    limiter hold) is dropped instead of sent.
+
+    The worker waits for the rate limiter before it takes a message off
+    the queue, so a callout submitted while the limiter is holding the
+    sender still goes ahead of everything less urgent.
+
+    Every message submit() accepted is eventually reported to `on_done`
+    (if set): delivered=True once it was sent, False if it was dropped,
+    evicted, cancelled or failed. It may be called from the worker thread.
+    """
+
+    def __init__(
+        self,
+        settings: ChatSettings,
+        max_queue: int = 4,
+        backend: Optional[ChatBackend] = None,
+    ) -> None:
+        self._settings = settings
+        self.backend = backend or make_backend(settings)
+        self._settings_by_mode: Dict[str, ChatSettings] = {}
+        self._queue = SendScheduler(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._cancel = threading.Event()
+        self._current: Optional[PendingChat] = None  # being typed right now
+        self._limiter: Optional[TokenBucket] = None
+        if settings.chat_rate_per_s > 0:
+            self._limiter = TokenBucket(
+                settings.chat_rate_per_s,
+                settings.chat_burst,
+                min_interval_s=settings.chat_spam_interval_s,
+            )
+        self.stats = SenderStats()
+        self.on_done: Optional[Callable[[PendingChat, bool], None]] = None
+
+    def _done(self, item: PendingChat, delivered: bool) -> None:
+        on_done = self.on_done
+        if on_done is not None:
+            on_done(item, delivered)
+
+    def start(self) -> None:
+        """Start the worker thread (no-op if already running)."""
+        if self._thread is not None:
+            return
+        self._queue.reopen()
+        self._thread = threading.Thread(target=self._run, name="quickchat-sender", daemon=True)
+        self._thread.start()
+
+    def queue_depth(self) -> int:
+        """Number of messages waiting to be delivered."""
+        return len(self._queue)
+
+    def submit(
+        self,
+        message: str,
+        chat_mode: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL,
+        key: Optional[str] = None,
+        tag: object = None,
+    ) -> bool:
+        """
+        Queue a message for delivery.
+
+        Args:
+            message: The message to type
+            chat_mode: Chat to send it to (default: the settings' chat mode)
+            priority: Higher goes first (PRIORITY_LOW/NORMAL/HIGH)
+            key: Coalescing key, e.g. the combo's template; a message whose
+                 key is already queued for the same chat mode is merged
+                 into that one
+            tag: Passed back to on_done with the outcome
+
+        Returns:
+            True if the message was queued (on_done will report how it went).
+            False if it was coalesced into a queued one or the queue was
+            full (it won't be sent, and on_done isn't called).
+        """
+        if chat_mode is None:
+            chat_mode = self._settings.chat_mode
+        outcome, evicted = self._queue.push(PendingChat(message, time.perf_counter(), chat_mode, priority, key, tag))
+        if outcome == "queued":
+            # A more urgent message interrupts one that is being typed
+            with self._lock:
+                if self._current is not None and priority > self._current.priority:
+                    self._cancel.set()
+        if outcome == "coalesced":
+            with self._lock:
+                self.stats.coalesced += 1
+            return False
+        if outcome == "full":
+            with self._lock:
+                self.stats.dropped_full += 1
+            print(f"Warning: send queue full, dropped quick chat: {message}")
+            return False
+        depth = len(self._queue)
+        with self._lock:
+            self.stats.max_depth = max(self.stats.max_depth, depth)
+            if evicted is not None:
+                self.stats.preempted += 1
+        if evicted is not None:
+            print(f"Dropped queued quick chat for a more urgent one: {evicted.message}")
+            self._done(evicted, False)
+        return True
+
+    def cancel(self, clear_queue: bool = True) -> None:
+        """
+        Abort the message being typed (its chat box is closed again).
+
+        Args:
+            clear_queue: Also discard every message still waiting
+        """
+        dropped: List[PendingChat] = []
+        with self._lock:
+            if clear_queue:
+                dropped = self._queue.clear()
+            if self._current is not None:
+                self._cancel.set()
+        for item in dropped:
+            self._done(item, False)
+
+    def stop(self, timeout_s: Optional[float] = 2.0, drain: bool = False) -> None:
+        """
+        Stop the worker thread.
+
+        Args:
+            timeout_s: How long to wait for the worker (None = forever)
+            drain: If True, deliver everything still queued first. If False,
+                   queued messages are discarded; the message being typed
+                   right now (if any) is allowed to finish.
+        """
+        if self._thread is None:
+            return
+        if not drain:
+            # Throw away anything not yet started, and stop waiting on the
+            # rate limiter
+            self._stopping.set()
+            for item in self._queue.clear():
+                self._done(item, False)
+        # Wake the worker up (after the remaining messages, if draining)
+        self._queue.close()
+        self._thread.join(timeout_s)
+        self._thread = None
+        self._stopping.clear()
+
+    def _settings_for(self, chat_mode: Optional[str]) -> ChatSettings:
+        """Chat settings for a message, switching chat mode if asked to."""
+        if chat_mode is None or chat_mode == self._settings.chat_mode:
+            return self._settings
+        settings = self._settings_by_mode.get(chat_mode)
+        if settings is None:
+            settings = self._settings_by_mode[chat_mode] = replace(self._settings, chat_mode=chat_mode)
+        return settings
+
+    def _wait_for_slot(self) -> bool:
+        """
+        Wait until the rate limiter allows the next message.
+
+        No message is taken off the queue until then, so whatever is most
+        urgent once the wait is over goes first.
+
+        Returns:
+            False if the sender is stopping
+        """
+        delay = self._limiter.delay() if self._limiter is not None else 0.0
+        if delay > 0:
+            if self._stopping.wait(delay):
+                return False
+            with self._lock:
+                self.stats.throttled += 1
+                self.stats.total_throttle_s += delay
+                self.stats.max_throttle_s = max(self.stats.max_throttle_s, delay)
+            stats = STATS
+            if stats is not None:
+                stats.record("throttle", delay)
+        return True
+
+    def _is_stale(self, item: PendingChat) -> bool:
+        """Drop (and report) a message that has outlived its TTL."""
+        ttl = self._settings.message_ttl_s
+        age = time.perf_counter() - item.queued_at
+        if ttl <= 0 or age <= ttl:
+            return False
+        with self._lock:
+            self.stats.dropped_stale += 1
+        print(f"Dropped stale quick chat ({age:.1f} s old): {item.message}")
+        return True
+
+    def _run(self) -> None:
+        while self._queue.wait():
+            if not self._wait_for_slot():
+                continue  # Stopping: the queue was cleared
+            with self._lock:
+                # Taken off the queue and marked current in one step, so a
+                # cancel() or a more urgent submit() can't slip in between
+                item = self._current = self._queue.pop()
+                self._cancel.clear()
+            if item is None:
+                continue  # Cancelled while waiting for the limiter
+            message, queued_at, chat_mode = item.message, item.queued_at, item.chat_mode
+            started = time.perf_counter()
+            waited = started - queued_at
+            depth = len(self._queue)
+            delivered = False
+            try:
+                if self._is_stale(item):
+                    continue  # The slot is still free
+                if self._limiter is not None:
+                    self._limiter.take()
+                if self._cancel.is_set():
+                    raise DeliveryCancelled()  # Don't even open the chat box
+                send_chat(
+                    message,
+                    self._settings_for(chat_mode),
+                    backend=self.backend,
+                    pace=self._limiter is None,
+                    cancel=self._cancel,
+                )
+                delivered = True
+                stats = STATS
+                if stats is not None:
+                    stats.record("queue_wait", waited)
+                    stats.record("deliver", time.perf_counter() - started)
+            except DeliveryCancelled:
+                with self._lock:
+                    self.stats.cancelled += 1
+                print(f"Cancelled quick chat mid-typing: {message}")
+                continue
+            except Exception as e:
+                with self._lock:
+                    self.stats.failed += 1
+                    self.stats.total_wait_s += waited
+                    self.stats.max_wait_s = max(self.stats.max_wait_s, waited)
+                print(f"Warning: failed to send quick chat {message!r}: {e}")
+                continue
+            finally:
+                with self._lock:
+                    self._current = None
+                self._done(item, delivered)
+            with self._lock:
+                self.stats.sent += 1
+                self.stats.total_wait_s += waited
+                self.stats.max_wait_s = max(self.stats.max_wait_s, waited)
+            print(f"Sent quick chat: {message} (waited {waited * 1000.0:.0f} ms, {depth} queued)")
+
+
+# =============================================================================
+# D-PAD HANDLING
+# =============================================================================
+
+
+def hat_to_dpad_action(value: Tuple[int, int]) -> Optional[str]:
+    """
+    Convert a "hat" (D-pad) value from pygame to a direction string.
+
+    Pygame represents D-pad as a tuple of (x, y) where:
+        - x: -1 = left, 0 = center, 1 = right
+        - y: -1 = down, 0 = center, 1 = up
+
+    Returns:
+        "up", "down", "left", "right", or None if centered
+    """
+    x, y = value
+    if x == 0 and y == 0:
+        return None
+    if y == 1:
+        return "up"
+    if y == -1:
+        return "down"
+    if x == -1:
+        return "left"
+    if x == 1:
+        return "right"
+    return None
+
+
+# =============================================================================
+# COMBO MATCHING
+# =============================================================================
+# Macro sequences are stored in a prefix tree (trie): each node is "the inputs
+# pressed so far", and each child is one possible next input. Matching an
+# input is a single dict lookup from the current node, no matter how many
+# macros exist or how long they are.
+#
+# Rules:
+#   - A sequence needs at least two inputs (D-pad directions or button names
+#     from BUTTONS, freely mixed)
+#   - The shortest match wins: as soon as a complete sequence is entered its
+#     macro fires. A sequence that starts with another complete sequence
+#     could never fire, so that's rejected when the trie is built.
+#   - Each node has its own timeout: the max gap allowed before the next
+#     input. If it's exceeded, the input starts a new sequence instead.
+#   - Inputs that don't appear in any sequence (jump, boost...) are ignored
+#     and don't interrupt a combo in progress.
+# =============================================================================
+
+
+class ComboNode:
+    """One node of the combo trie (a prefix of one or more sequences)."""
+
+    __slots__ = ("children", "template", "window_s")
+
+    def __init__(self, window_s: float) -> None:
+        self.children: Dict[str, ComboNode] = {}
+        self.template: Optional[str] = None
+        self.window_s = window_s
+
+
+class ComboTrie:
+    """
+    Prefix tree of macro sequences, built once at startup.
+
+    Args:
+        macros: Mapping of input sequences to template strings
+        window_s: Default max gap between consecutive inputs
+    """
+
+    def __init__(self, macros: Mapping[Tuple[str, ...], str], window_s: float) -> None:
+        self.window_s = window_s
+        self.root = ComboNode(window_s)
+        self.alphabet: FrozenSet[str] = frozenset()
+        for sequence, template in macros.items():
+            self.add(sequence, template)
+
+    def add(self, sequence: Sequence[str], template: str, window_s: Optional[float] = None) -> None:
+        """
+        Add a macro sequence.
+
+        Args:
+            sequence: The inputs, in order (e.g. ("up", "up", "left"))
+            template: The template to send when the sequence is entered
+            window_s: Optional max gap between this sequence's inputs; if
+                      set, it widens the timeout of every node on the path
+
+        Raises:
+            ValueError: If the sequence is too short, duplicated, or
+                        overlaps a shorter/longer sequence
+        """
+        sequence = tuple(sequence)
+        if len(sequence) < 2:
+            raise ValueError(f"Macro {sequence} needs at least two inputs")
+        node = self.root
+        for depth, action in enumerate(sequence):
+            if window_s is not None:
+                node.window_s = max(node.window_s, window_s)
+            node = node.children.setdefault(action, ComboNode(self.window_s))
+            if node.template is not None:
+                prefix = sequence[: depth + 1]
+                if depth + 1 == len(sequence):
+                    raise ValueError(f"Macro {sequence} is defined twice")
+                raise ValueError(f"Macro {sequence} can never fire: {prefix} always fires first")
+        if node.children:
+            raise ValueError(f"Macro {sequence} would block longer macros that start with it")
+        node.template = template
+        self.alphabet = self.alphabet.union(sequence)
+
+
+def build_combo_trie(macro_map: Mapping[Tuple[str, ...], str], window_s: float) -> ComboTrie:
+    """
+    Build the combo trie for a macro table.
+
+    Raises:
+        ValueError: If the table breaks a ComboTrie rule, or uses the PS
+                    button (reserved for toggling macros)
+    """
+    combos = ComboTrie(macro_map, window_s=window_s)
+    if "ps" in combos.alphabet:
+        raise ValueError("The PS button is reserved for toggling macros and can't be part of a combo")
+    return combos
+
+
+class ComboMatcher:
+    """
+    Walks a ComboTrie one input at a time.
+
+    Holds the state of a combo in progress (current node and when the last
+    input arrived). feed() is O(1) per input.
+    """
+
+    def __init__(self, trie: ComboTrie, min_gap_s: float) -> None:
+        self._trie = trie
+        self._min_gap_s = min_gap_s
+        self._node = trie.root
+        self._last_time = 0.0
+
+    def reset(self) -> None:
+        """Forget any combo in progress."""
+        self._node = self._trie.root
+        self._last_time = 0.0
+
+    def feed(self, action: str, now: float) -> Optional[str]:
+        """
+        Process one input.
+
+        Returns:
+            The template of the macro that just completed, or None
+        """
+        root = self._trie.root
+        if action not in self._trie.alphabet:
+            return None
+
+        node = self._node
+        if node is not root:
+            elapsed = now - self._last_time
+            # Too fast? Ignore (probably button bounce)
+            if elapsed < self._min_gap_s:
+                return None
+            # Too slow? Start a new potential combo
+            if elapsed > node.window_s:
+                node = root
+
+        child = node.children.get(action)
+        if child is None and node is not root:
+            # Wrong next input: it may still start a new combo
+            child = root.children.get(action)
+        if child is None:
+            self.reset()
+            return None
+        if child.template is not None:
+            self.reset()
+            return child.template
+
+        self._node = child
+        self._last_time = now
+        return None
+
+
+# =============================================================================
+# PERSISTENCE
+# =============================================================================
+# With --persist, cooldown history is kept in two files:
+#
+#   quickchat_state.json          Snapshot: {"last_sent_message": ...,
+#                                            "recent_messages": [[msg, t], ...],
+#                                            "picker_state": {category: bag}}
+#   quickchat_state.json.journal  One JSON line [msg, t] per message sent
+#                                 since the snapshot was written
+#
+# Every send is appended to the journal by a background thread, in small
+# batches, so the controller loop never waits on the disk and a crash or
+# power loss costs at most one batch. Every few hundred sends (and on exit)
+# the journal is compacted: a fresh snapshot is written to a temp file and
+# renamed over the old one (atomic), then the journal is emptied. Loading
+# reads the snapshot and replays the journal on top of it.
+# =============================================================================
+
+
+def write_snapshot(path: str, payload: Mapping[str, object]) -> None:
+    """
+    Atomically replace a JSON snapshot file.
+
+    The data is written to a temp file next to the target, flushed to disk,
+    then renamed over it, so readers see either the old or the new file -
+    never a half-written one.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_journal(path: str) -> Iterator[Tuple[str, float]]:
+    """
+    Stream (message, time) entries from a journal file.
+
+    Lines that can't be parsed (e.g. a torn last line after a crash) are
+    skipped.
+    """
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if (
+                isinstance(item, list)
+                and len(item) == 2
+                and isinstance(item[0], str)
+                and isinstance(item[1], (int, float))
+            ):
+                yield item[0], float(item[1])
+
+
+class CooldownJournal:
+    """
+    Append-only journal of sent messages, written off the hot path.
+
+    append() only queues the entry. A worker thread waits up to
+    flush_interval_s to collect a batch, then writes and fsyncs it.
+    compact() queues a snapshot write behind any pending appends, so the
+    snapshot always includes everything the journal it replaces held.
+
+    Args:
+        snapshot_path: The --persist JSON file; the journal lives next to it
+        flush_interval_s: Max time an entry waits before hitting the disk
+        compact_every: Journal entries after which needs_compaction() is True
+    """
+
+    def __init__(self, snapshot_path: str, flush_interval_s: float = 1.0, compact_every: int = 500) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + ".journal"
+        self._flush_interval_s = flush_interval_s
+        self._compact_every = compact_every
+        self._queue: "queue.Queue[Tuple[str, object]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._since_compaction = 0
+
+    def start(self) -> None:
+        """Start the writer thread (no-op if already running)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="quickchat-journal", daemon=True)
+        self._thread.start()
+
+    def append(self, message: str, t: float) -> None:
+        """Queue one sent message for the journal."""
+        self._since_compaction += 1
+        self._queue.put(("append", (message, t)))
+
+    def needs_compaction(self) -> bool:
+        """True once enough entries have piled up since the last snapshot."""
+        return self._since_compaction >= self._compact_every
+
+    def compact(self, payload: Mapping[str, object]) -> None:
+        """Queue a snapshot write (which also empties the journal)."""
+        self._since_compaction = 0
+        self._queue.put(("snapshot", dict(payload)))
+
+    def close(self, payload: Optional[Mapping[str, object]] = None, timeout_s: float = 5.0) -> None:
+        """Write a final snapshot (if given), flush everything and stop."""
+        if payload is not None:
+            self.compact(payload)
+        self._queue.put(("stop", None))
+        if self._thread is None:
+            # Never started: do the work on this thread instead
+            self._run()
+            return
+        self._thread.join(timeout_s)
+        self._thread = None
+
+    def _run(self) -> None:
+        journal = None
+        try:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            journal = open(self.journal_path, "a", encoding="utf-8")
+            while True:
+                op, arg = self._queue.get()
+                batch: List[str] = []
+                # Collect a batch of appends for up to flush_interval_s
+                deadline = time.monotonic() + self._flush_interval_s
+                while op == "append":
+                    message, t = cast(Tuple[str, float], arg)
+                    batch.append(json.dumps([message, t], ensure_ascii=False))
+                    try:
+                        op, arg = self._queue.get(timeout=max(0.001, deadline - time.monotonic()))
+                    except queue.Empty:
+                        op, arg = "", None
+                if batch:
+                    journal.write("\n".join(batch) + "\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                if op == "snapshot":
+                    try:
+                        write_snapshot(self.snapshot_path, arg)  # type: ignore[arg-type]
+                    except Exception as e:
+                        print(f"Warning: failed to write snapshot {self.snapshot_path!r}: {e}")
+                        continue
+                    # Everything in the journal is now in the snapshot
+                    journal.close()
+                    journal = open(self.journal_path, "w", encoding="utf-8")
+                elif op == "stop":
+                    return
+        except Exception as e:
+            print(f"Warning: cooldown journal stopped: {e}")
+        finally:
+            if journal is not None:
+                journal.close()
+
+
+# =============================================================================
+# MESSAGE PACKS
+# =============================================================================
+# Messages and macros can also come from JSON or TOML files (--pack), layered
+# over the built-in `variations` and `macros` in the order given. A pack
+# replaces whole categories and single macros; an empty template removes a
+# macro. Combos are written as space-separated input names:
+#
+#   {"variations": {"Nice One": ["Clean!", "What a touch!"]},
+#    "macros": {"L1 up up": "{Nice One}", "down down": ""},
+#    "priorities": {"Nice One": 2}}
+#
+#   [variations]
+#   "Nice One" = ["Clean!", "What a touch!"]
+#   [macros]
+#   "L1 up up" = "{Nice One}"
+#   [priorities]
+#   "Nice One" = 2
+#
+# Hot reload: a background thread stats the pack files every --pack-poll
+# seconds. When one changes it re-reads every pack, validates the result,
+# rebuilds the combo trie and compiles new or affected templates - all off
+# the event loop. The finished corpus is handed over in one piece and swapped
+# in from MacroEngine.housekeeping(), so input handling never waits on a
+# reload. A pack that fails to load is reported and the current corpus kept.
+# =============================================================================
+
+
+class MessagePack(NamedTuple):
+    """The contents of one message pack file."""
+    variations: Dict[str, List[str]]
+    macros: Dict[Tuple[str, ...], str]  # a template of "" removes the combo
+    priorities: Dict[str, int]
+
+
+def _pack_table(path: str, data: Mapping[str, object], name: str) -> Dict[object, object]:
+    """One top-level table of a pack ({} if absent), checked to be a table."""
+    table = data.get(name)
+    if table is None:
+        return {}
+    if not isinstance(table, dict):
+        raise ValueError(f'{path}: "{name}" must be a table, not {type(table).__name__}')
+    return table
+
+
+def load_message_pack(path: str) -> MessagePack:
+    """
+    Read and validate one message pack file.
+
+    Raises:
+        OSError: If the file can't be read
+        ValueError: If it isn't valid JSON/TOML or has the wrong shape
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.lower().endswith(".toml"):
+        if tomllib is None:
+            raise ValueError(f"{path}: TOML packs need Python 3.11+; use JSON instead")
+        data = tomllib.loads(raw.decode("utf-8"))
+    else:
+        data = json.loads(raw.decode("utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a table with 'variations' and/or 'macros'")
+
+    pack_variations: Dict[str, List[str]] = {}
+    for key, items in _pack_table(path, data, "variations").items():
+        if not isinstance(items, list) or not items or not all(isinstance(i, str) for i in items):
+            raise ValueError(f'{path}: category "{key}" must be a non-empty list of strings')
+        pack_variations[str(key)] = list(items)
+
+    pack_macros: Dict[Tuple[str, ...], str] = {}
+    for combo, template in _pack_table(path, data, "macros").items():
+        sequence = tuple(str(combo).split())
+        unknown = [a for a in sequence if a not in BUTTONS]
+        if unknown:
+            raise ValueError(f'{path}: macro "{combo}" uses unknown inputs {unknown}; valid: {sorted(BUTTONS)}')
+        if not isinstance(template, str):
+            raise ValueError(f'{path}: macro "{combo}" must map to a template string')
+        pack_macros[sequence] = template
+
+    pack_priorities: Dict[str, int] = {}
+    for key, priority in _pack_table(path, data, "priorities").items():
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            raise ValueError(f'{path}: priority of "{key}" must be an integer (0 low, 1 normal, 2 high)')
+        pack_priorities[str(key)] = priority
+    return MessagePack(pack_variations, pack_macros, pack_priorities)
+
+
+@dataclass(frozen=True)
+class Corpus:
+    """
+    A complete, validated set of messages and macros.
+
+    Attributes:
+        variations: Category name -> message list
+        macros: Input sequence -> template
+        templates: Every macro template, compiled against `variations`
+        priorities: Category name -> send priority
+    """
+    variations: Mapping[str, Sequence[str]]
+    macros: Mapping[Tuple[str, ...], str]
+    templates: Mapping[str, CompiledTemplate]
+    priorities: Mapping[str, int] = field(default_factory=dict)
+
+
+class CorpusUpdate(NamedTuple):
+    """A reloaded corpus, ready to swap into a running engine."""
+    corpus: Corpus
+    combos: Optional[ComboTrie]  # None if the macro table didn't change
+    changed_categories: Tuple[str, ...]
+    removed_categories: Tuple[str, ...]
+
+
+def merge_message_packs(
+    base_variations: Mapping[str, Sequence[str]],
+    base_macros: Mapping[Tuple[str, ...], str],
+    pack_paths: Sequence[str],
+    base_priorities: Optional[Mapping[str, int]] = None,
+) -> Tuple[Dict[str, List[str]], Dict[Tuple[str, ...], str], Dict[str, int]]:
+    """
+    Layer message packs over the built-in tables (nothing is compiled).
+
+    Returns:
+        (variations, macros, priorities) after applying every pack
+
+    Raises:
+        OSError, ValueError: If a pack can't be loaded
+    """
+    merged_variations: Dict[str, List[str]] = {k: list(v) for k, v in base_variations.items()}
+    merged_macros: Dict[Tuple[str, ...], str] = dict(base_macros)
+    merged_priorities: Dict[str, int] = dict(category_priorities if base_priorities is None else base_priorities)
+    for path in pack_paths:
+        pack = load_message_pack(path)
+        merged_variations.update(pack.variations)
+        merged_priorities.update(pack.priorities)
+        for sequence, template in pack.macros.items():
+            if template:
+                merged_macros[sequence] = template
+            else:
+                merged_macros.pop(sequence, None)
+    return merged_variations, merged_macros, merged_priorities
+
+
+def build_corpus(
+    base_variations: Mapping[str, Sequence[str]],
+    base_macros: Mapping[Tuple[str, ...], str],
+    pack_paths: Sequence[str],
+    previous: Optional[Corpus] = None,
+    base_priorities: Optional[Mapping[str, int]] = None,
+) -> Tuple[Corpus, Tuple[str, ...]]:
+    """
+    Layer message packs over the built-in corpus and compile its templates.
+
+    Templates from `previous` are reused when none of the categories they
+    use changed, so a reload only recompiles what the edit touched.
+
+    Returns:
+        (corpus, names of categories added or changed since `previous`)
+
+    Raises:
+        OSError, ValueError: If a pack can't be loaded
+        KeyError: If a template names a category that doesn't exist
+    """
+    merged_variations, merged_macros, merged_priorities = merge_message_packs(
+        base_variations, base_macros, pack_paths, base_priorities
+    )
+
+    old_variations = previous.variations if previous is not None else {}
+    changed = tuple(k for k, v in merged_variations.items() if old_variations.get(k) != v)
+    changed_set = frozenset(changed)
+    old_templates = previous.templates if previous is not None else {}
+    resolve_key = VariationPicker(merged_variations).resolve_key
+    templates: Dict[str, CompiledTemplate] = {}
+    for template in merged_macros.values():
+        if template in templates:
+            continue
+        compiled = old_templates.get(template)
+        if compiled is None or any(
+            slot.key in changed_set or slot.key not in merged_variations for slot in compiled.slots
+        ):
+            compiled = compile_template(template, resolve_key)
+        templates[template] = compiled
+    corpus = Corpus(
+        variations=merged_variations,
+        macros=merged_macros,
+        templates=templates,
+        priorities=merged_priorities,
+    )
+    return corpus, changed
+
+
+class PackWatcher:
+    """
+    Watches message pack files and rebuilds the corpus when they change.
+
+    Polling is a handful of os.stat() calls per interval on a background
+    thread. A rebuilt corpus waits in a single slot until the engine picks
+    it up with poll(); if the files change again first, the newer corpus
+    simply replaces it.
+
+    Args:
+        pack_paths: Pack files, lowest priority first
+        base_variations: Built-in categories the packs are layered over
+        base_macros: Built-in macro table the packs are layered over
+        window_s: Combo window, used to prebuild the combo trie
+        interval_s: Seconds between checks
+    """
+
+    def __init__(
+        self,
+        pack_paths: Sequence[str],
+        base_variations: Mapping[str, Sequence[str]],
+        base_macros: Mapping[Tuple[str, ...], str],
+        window_s: float,
+        interval_s: float = 1.0,
+    ) -> None:
+        self._paths = tuple(pack_paths)
+        self._base_variations = base_variations
+        self._base_macros = base_macros
+        self._window_s = window_s
+        self._interval_s = interval_s
+        self._corpus: Optional[Corpus] = None
+        self._signature: Tuple[Tuple[str, Optional[int], Optional[int]], ...] = ()
+        self._pending: Optional[CorpusUpdate] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self) -> Corpus:
+        """
+        Build the initial corpus, synchronously (call before starting).
+
+        Raises:
+            OSError, ValueError, KeyError: If a pack or template is invalid
+        """
+        self._signature = self._stat_all()
+        corpus, _ = build_corpus(self._base_variations, self._base_macros, self._paths)
+        build_combo_trie(corpus.macros, self._window_s)
+        self._corpus = corpus
+        return corpus
+
+    def adopt(self, corpus: Corpus) -> None:
+        """Use a corpus built elsewhere (e.g. a --bundle) as the starting point."""
+        self._signature = self._stat_all()
+        self._corpus = corpus
+
+    def start(self) -> None:
+        """Start polling in the background."""
+        if self._thread is None and self._paths:
+            self._thread = threading.Thread(target=self._run, name="pack-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def poll(self) -> Optional[CorpusUpdate]:
+        """Take the latest rebuilt corpus, if there is one (never blocks on a rebuild)."""
+        if self._pending is None:
+            return None
+        with self._lock:
+            update, self._pending = self._pending, None
+        return update
+
+    def _stat_all(self) -> Tuple[Tuple[str, Optional[int], Optional[int]], ...]:
+        signature: List[Tuple[str, Optional[int], Optional[int]]] = []
+        for path in self._paths:
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval_s):
+            signature = self._stat_all()
+            if signature == self._signature:
+                continue
+            # Remember the new signature even if loading fails, so a broken
+            # file is reported once rather than every interval
+            self._signature = signature
+            try:
+                self._rebuild()
+            except Exception as e:
+                # Whatever went wrong, keep watching: the next edit may fix it
+                print(f"Warning: message packs not reloaded, keeping the current ones: {e}")
+
+    def _rebuild(self) -> None:
+        previous = self._corpus
+        corpus, changed = build_corpus(self._base_variations, self._base_macros, self._paths, previous)
+        combos = None
+        if previous is None or corpus.macros != previous.macros:
+            combos = build_combo_trie(corpus.macros, self._window_s)
+        old_keys = previous.variations if previous is not None else {}
+        removed = tuple(k for k in old_keys if k not in corpus.variations)
+        self._corpus = corpus
+        with self._lock:
+            pending = self._pending
+            if pending is not None:
+                # The engine hasn't taken the previous update yet; fold it in
+                changed = tuple(dict.fromkeys(pending.changed_categories + changed))
+                removed = tuple(k for k in dict.fromkeys(pending.removed_categories + removed)
+                                if k not in corpus.variations)
+                if combos is None:
+                    combos = pending.combos
+            self._pending = CorpusUpdate(corpus, combos, changed, removed)
+
+
+# =============================================================================
+# CORPUS COMPILER
+# =============================================================================
+# `python DS5QuickchatsRL.py compile` checks the whole corpus (built-ins plus
+# any --pack files) in one pass, so mistakes show up before a match rather
+# than as an error the moment a combo is pressed:
+#
+#   errors    unknown {category}, unknown :modifier, unknown input names,
+#             conflicting combos, empty categories/messages, messages over
+#             the chat length limit
+#   warnings  templates that can render over the limit, messages that --ascii
+#             would empty or mangle, duplicate messages, category names that
+#             collide, tiny categories, braces in messages (not expanded)
+#
+# If there are no errors it writes a bundle: the merged corpus, compiled
+# templates and the category alias index, marshalled. `--bundle FILE` loads
+# it instead of merging packs and compiling at startup. The bundle stores a
+# fingerprint of this script and the packs; if either changed since, it is
+# ignored and the corpus is built from source.
+# =============================================================================
+
+# Longest message (in characters) Rocket League accepts in chat
+CHAT_MAX_CHARS = 120
+
+BUNDLE_MAGIC = "RLQC-bundle"
+BUNDLE_VERSION = 1
+
+
+class CorpusIssue(NamedTuple):
+    """A problem found by validate_corpus()."""
+    severity: str  # "error" or "warning"
+    where: str
+    message: str
+
+
+def validate_corpus(
+    corpus_variations: Mapping[str, Sequence[str]],
+    corpus_macros: Mapping[Tuple[str, ...], str],
+    priorities: Mapping[str, int],
+    max_chars: int = CHAT_MAX_CHARS,
+) -> Tuple[Dict[str, CompiledTemplate], List[CorpusIssue]]:
+    """
+    Check a merged corpus and compile its templates.
+
+    Returns:
+        (templates that compiled, every issue found)
+    """
+    issues: List[CorpusIssue] = []
+
+    def error(where: str, message: str) -> None:
+        issues.append(CorpusIssue("error", where, message))
+
+    def warn(where: str, message: str) -> None:
+        issues.append(CorpusIssue("warning", where, message))
+
+    picker = VariationPicker(corpus_variations)
+    ascii_check = AsciiCache()
+    spellings: Dict[str, str] = {}
+    owners: Dict[str, str] = {}
+    for key, items in corpus_variations.items():
+        where = f'category "{key}"'
+        spelling = key.lower().replace("_", " ")
+        if spelling in spellings:
+            warn(where, f'looks the same as "{spellings[spelling]}" in templates; "{spellings[spelling]}" wins')
+        spellings.setdefault(spelling, key)
+        if not items:
+            error(where, "has no messages")
+            continue
+        if len(items) < 3:
+            warn(where, f"has only {len(items)} message(s); repeats are likely")
+        seen: set = set()
+        for item in items:
+            if not item.strip():
+                error(where, "has an empty message")
+            elif len(item) > max_chars:
+                error(where, f"{item!r} is {len(item)} characters (limit {max_chars})")
+            if item in seen:
+                warn(where, f"lists {item!r} twice")
+            seen.add(item)
+            owner = owners.setdefault(item, key)
+            if owner != key:
+                warn(where, f'{item!r} is also in "{owner}"')
+            if "{" in item and "}" in item:
+                warn(where, f"{item!r} has braces, but messages aren't templates and are sent as-is")
+        for problem in ascii_check.prime({key: items}):
+            warn(where, f"with --ascii, {problem.split(': ', 1)[1]}")
+
+    templates: Dict[str, CompiledTemplate] = {}
+    for sequence, template in corpus_macros.items():
+        where = f"macro {' '.join(sequence)}"
+        unknown = [a for a in sequence if a not in BUTTONS]
+        if unknown:
+            error(where, f"uses unknown inputs {unknown}")
+        compiled = templates.get(template)
+        if compiled is None:
+            try:
+                compiled = compile_template(template, picker.resolve_key)
+            except KeyError as e:
+                error(where, str(e.args[0]))
+                continue
+            except ValueError as e:
+                error(where, str(e))
+                continue
+            templates[template] = compiled
+        longest = 0
+        for part in compiled.parts:
+            if isinstance(part, str):
+                longest += len(part)
+                if "{" in part:
+                    warn(where, f"{template!r} has an unclosed brace; it is sent literally")
+            else:
+                longest += max((len(i) for i in corpus_variations[part.key]), default=0)
+        if longest > max_chars:
+            warn(where, f"{template!r} can render up to {longest} characters (limit {max_chars})")
+    try:
+        build_combo_trie(corpus_macros, window_s=1.0)
+    except ValueError as e:
+        error("macros", str(e))
+    for key in priorities:
+        try:
+            picker.resolve_key(key)
+        except KeyError:
+            warn(f'priority "{key}"', "names an unknown category")
+    return templates, issues
+
+
+class Bundle(NamedTuple):
+    """A corpus loaded from a compiled bundle."""
+    corpus: Corpus
+    alias_index: Tuple[Dict[str, str], Dict[str, str]]
+    pack_paths: Tuple[str, ...]
+
+
+class StaleBundle(ValueError):
+    """The bundle was built from a different script or different packs."""
+
+    def __init__(self, path: str, pack_paths: Sequence[str]) -> None:
+        super().__init__(f"{path} is out of date (the script or a message pack changed since it was compiled)")
+        self.pack_paths = tuple(pack_paths)
+
+
+def corpus_fingerprint(pack_paths: Sequence[str]) -> str:
+    """Hash of this script and the pack files, to spot stale bundles."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(BUNDLE_VERSION).encode("ascii"))
+    for path in (os.path.abspath(__file__), *pack_paths):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def write_bundle(
+    path: str,
+    corpus: Corpus,
+    alias_index: Tuple[Mapping[str, str], Mapping[str, str]],
+    pack_paths: Sequence[str],
+) -> int:
+    """
+    Write a compiled corpus to a bundle file (atomically).
+
+    Returns:
+        Size of the bundle in bytes
+    """
+    def part_record(part: Union[str, TemplateSlot]) -> object:
+        if isinstance(part, str):
+            return part
+        return (part.key, part.modifier)
+
+    # Plain (not sys.intern'd) strings: marshal re-interns interned strings
+    # one by one on load, which made a large bundle slower to read than the
+    # packs it was built from.
+    payload = {
+        "magic": BUNDLE_MAGIC,
+        "version": BUNDLE_VERSION,
+        "fingerprint": corpus_fingerprint(pack_paths),
+        "packs": [os.path.abspath(p) for p in pack_paths],
+        "variations": {k: list(v) for k, v in corpus.variations.items()},
+        "macros": [(tuple(seq), t) for seq, t in corpus.macros.items()],
+        "templates": {t: tuple(part_record(p) for p in c.parts) for t, c in corpus.templates.items()},
+        "priorities": dict(corpus.priorities),
+        "aliases": dict(alias_index[0]),
+        "folded_aliases": dict(alias_index[1]),
+    }
+    data = marshal.dumps(payload)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_bundle(path: str) -> Bundle:
+    """
+    Load a bundle written by write_bundle().
+
+    Raises:
+        OSError: If the file can't be read
+        StaleBundle: If the script or a pack changed since it was built
+        ValueError: If it isn't a bundle this version can read
+    """
+    with open(path, "rb") as f:
+        try:
+            payload = marshal.loads(f.read())
+        except (EOFError, TypeError, ValueError) as e:
+            raise ValueError(f"{path} is not a quickchat bundle ({e})") from None
+    if not isinstance(payload, dict) or payload.get("magic") != BUNDLE_MAGIC:
+        raise ValueError(f"{path} is not a quickchat bundle")
+    if payload.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"{path} is bundle version {payload.get('version')}; recompile it")
+    pack_paths = tuple(payload["packs"])
+    try:
+        fingerprint = corpus_fingerprint(pack_paths)
+    except OSError:
+        fingerprint = None
+    if fingerprint != payload["fingerprint"]:
+        raise StaleBundle(path, pack_paths)
+
+    templates: Dict[str, CompiledTemplate] = {}
+    for template, records in payload["templates"].items():
+        parts: List[Union[str, TemplateSlot]] = []
+        for record in records:
+            if isinstance(record, str):
+                parts.append(record)
+            else:
+                key, modifier = record
+                parts.append(TemplateSlot(key, resolve_text_modifier(modifier), modifier))
+        templates[template] = CompiledTemplate(source=template, parts=tuple(parts))
+    corpus = Corpus(
+        variations=payload["variations"],
+        macros=dict(payload["macros"]),
+        templates=templates,
+        priorities=payload["priorities"],
+    )
+    return Bundle(corpus, (payload["aliases"], payload["folded_aliases"]), pack_paths)
+
+
+def compile_main(argv: Sequence[str]) -> int:
+    """The `compile` subcommand: validate the corpus and write a bundle."""
+    parser = argparse.ArgumentParser(
+        prog="DS5QuickchatsRL.py compile",
+        description="Check every message and macro (built-ins plus packs) and write a "
+                    "prebuilt bundle that --bundle loads at startup.",
+    )
+    parser.add_argument(
+        "--pack",
+        action="append",
+        metavar="FILE",
+        help="Message pack to include (same as for running); repeatable"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        default="quickchats.bundle",
+        help="Bundle file to write (default: quickchats.bundle)"
+    )
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        default=CHAT_MAX_CHARS,
+        help=f"Longest allowed chat message in characters (default: {CHAT_MAX_CHARS})"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only validate; don't write a bundle"
+    )
+    args = parser.parse_args(argv)
+    pack_paths = list(args.pack or [])
+
+    try:
+        merged_variations, merged_macros, merged_priorities = merge_message_packs(variations, macros, pack_paths)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}")
+        return 2
+    templates, issues = validate_corpus(merged_variations, merged_macros, merged_priorities, args.max_length)
+    for issue in issues:
+        print(f"{issue.severity}: {issue.where}: {issue.message}")
+    errors = sum(1 for issue in issues if issue.severity == "error")
+    print(
+        f"{len(merged_variations)} categories, {sum(len(v) for v in merged_variations.values())} messages, "
+        f"{len(merged_macros)} macros: {errors} error(s), {len(issues) - errors} warning(s)"
+    )
+    if errors:
+        return 1
+    if args.check:
+        return 0
+
+    corpus = Corpus(
+        variations=merged_variations,
+        macros=merged_macros,
+        templates=templates,
+        priorities=merged_priorities,
+    )
+    size = write_bundle(args.output, corpus, VariationPicker(merged_variations).alias_index(), pack_paths)
+    print(f"Wrote {args.output} ({size} bytes)")
+    return 0
+
+
+# =============================================================================
+# LOOKAHEAD BUFFER
+# =============================================================================
+# Picking, rendering, --ascii conversion and the cooldown checks for the next
+# message of every macro are done ahead of time, between inputs: after each
+# send, MacroEngine.housekeeping() renders a fresh message for the templates
+# that don't have one ready. When a combo fires, the engine pops the finished
+# string and only re-checks its cooldown (a dict lookup), because something
+# sent in the meantime may have put it on cooldown.
+#
+# Buffered messages are dropped when the corpus is reloaded, and when the
+# same text is sent by another combo. The values a buffered message was
+# rendered from were already dealt from their shuffle bags, so a dropped
+# message puts them back, and saved bag state counts buffered ones as not
+# dealt yet; nothing is skipped in the no-repeat cycle.
+# =============================================================================
+
+# Templates rendered per housekeeping call, so a big macro table is filled
+# over a few loop iterations instead of stalling input handling.
+LOOKAHEAD_REFILL_PER_TICK = 8
+
+# Shortest wait before retrying a template whose messages were all on
+# cooldown. Until then its combo renders on the spot, as without the buffer.
+LOOKAHEAD_RETRY_S = 1.0
+
+
+class LookaheadBuffer:
+    """
+    The next ready-to-send message for each macro template.
+
+    Templates without a message ready are kept in the order they were
+    used, so refills go to the ones that have waited longest. A template
+    that can't be filled right now (every message is on cooldown) is
+    parked until a given time, so it isn't re-rendered after every input.
+
+    Each message is stored with the (category, item) picks it was rendered
+    from. When a message is thrown away unused, they're handed to `undeal`
+    to go back into their shuffle bags.
+
+    Attributes:
+        hits: Combos served from the buffer
+        misses: Combos that had to render on the spot
+        invalidated: Buffered messages thrown away before use
+    """
+
+    def __init__(self, undeal: Optional[Callable[[str, str], None]] = None) -> None:
+        self._ready: Dict[str, str] = {}
+        self._dealt: Dict[str, Sequence[Tuple[str, str]]] = {}  # template -> picks of its message
+        self._owner: Dict[str, str] = {}  # ready message -> its template
+        self._missing: Dict[str, None] = {}
+        self._parked: Dict[str, float] = {}
+        self._undeal = undeal
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def _return_picks(self, template: str) -> None:
+        self.give_back(self._dealt.pop(template, ()))
+
+    def dealt(self) -> List[Tuple[str, str]]:
+        """The picks every buffered message was rendered from (for saving bag state)."""
+        return [pick for picks in self._dealt.values() for pick in picks]
+
+    def reset(self, templates: Iterable[str]) -> None:
+        """Drop everything buffered and start filling for these templates."""
+        self.invalidated += len(self._ready)
+        for template in list(self._dealt):
+            self._return_picks(template)
+        self._ready.clear()
+        self._owner.clear()
+        self._parked.clear()
+        self._missing = dict.fromkeys(t for t in templates if t)
+
+    def wanted(self, limit: int, now: float) -> List[str]:
+        """Up to `limit` templates that need a message rendered."""
+        if self._parked:
+            for template in [t for t, retry_at in self._parked.items() if retry_at <= now]:
+                del self._parked[template]
+                self._missing[template] = None
+        return list(islice(self._missing, limit))
+
+    def put(self, template: str, message: str, picks: Sequence[Tuple[str, str]] = ()) -> None:
+        """Store the pre-rendered message for a template, and the picks it used."""
+        self._missing.pop(template, None)
+        self._ready[template] = message
+        self._dealt[template] = picks
+        self._owner[message] = template
+
+    def park(self, template: str, retry_at: float) -> None:
+        """Stop trying to fill a template until `retry_at`."""
+        self._missing.pop(template, None)
+        self._parked[template] = retry_at
+
+    def take(
+        self, template: str, usable: Callable[[str], bool]
+    ) -> Tuple[Optional[str], Sequence[Tuple[str, str]]]:
+        """
+        Pop the message for a template, and queue the template for a refill.
+
+        Returns:
+            (message, picks): the message, or None if none was ready or
+            `usable` rejected it, and the picks it was rendered from. If
+            the message ends up not being sent, hand them to give_back().
+        """
+        message = self._ready.pop(template, None)
+        if message is not None and self._owner.get(message) == template:
+            del self._owner[message]
+        if template not in self._parked:
+            self._missing[template] = None
+        if message is not None and not usable(message):
+            self.invalidated += 1
+            self._return_picks(template)
+            message = None
+        picks = self._dealt.pop(template, ())
+        if message is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return message, picks
+
+    def give_back(self, picks: Sequence[Tuple[str, str]]) -> None:
+        """Return the picks of a taken message that wasn't sent after all."""
+        if self._undeal is not None:
+            for key, item in reversed(picks):
+                self._undeal(key, item)
+
+    def discard_message(self, message: str) -> None:
+        """
+        Drop the buffered copy of a message that was just sent, so its
+        template is refilled before it's next used. (Rarer duplicates are
+        caught by take().)
+        """
+        template = self._owner.pop(message, None)
+        if template is not None and self._ready.get(template) == message:
+            del self._ready[template]
+            self._return_picks(template)
+            self._missing[template] = None
+            self.invalidated += 1
+
+    def summary(self) -> str:
+        """One-line human readable summary (printed on exit)."""
+        used = self.hits + self.misses
+        rate = self.hits / used * 100.0 if used else 0.0
+        return (
+            f"hits={self.hits} misses={self.misses} hit rate={rate:.0f}% "
+            f"invalidated={self.invalidated} ready={len(self._ready)}"
+        )
+
+
+# =============================================================================
+# MACRO ENGINE
+# =============================================================================
+
+
+@dataclass(frozen=True)
+class MacroSettings:
+    """
+    Configuration for the macro input detection.
+
+    Attributes:
+        macro_window_s: Maximum time between consecutive inputs of a combo
+                       (default 1.1 seconds)
+        macro_min_gap_s: Minimum time between presses (filters out bouncing)
+    """
+    macro_window_s: float = 1.1
+    macro_min_gap_s: float = 0.05
+
+
+@dataclass(frozen=True)
+class PadProfile:
+    """
+    Optional per-controller overrides, for couch play with several pads.
+
+    Attributes:
+        chat_mode: Chat mode for this pad's quickchats (None = --chat-mode)
+        macros: Macros layered over the shared table for this pad only;
+                an empty template removes a combo
+    """
+    chat_mode: Optional[str] = None
+    macros: Optional[Mapping[Tuple[str, ...], str]] = None
+
+
+@dataclass
+class PadState:
+    """Combo progress and settings of one connected controller."""
+    matcher: ComboMatcher
+    chat_mode: Optional[str] = None
+
+
+class QueuedSend(NamedTuple):
+    """
+    A message handed to the background sender, not yet known to be sent.
+
+    It goes on cooldown right away (so it isn't picked again while queued),
+    and becomes the last sent message and is journaled once the sender
+    reports it delivered. If the sender drops it instead, the cooldown is
+    taken back.
+    """
+    message: str
+    sent_at: float  # engine clock
+    previous_sent_at: Optional[float]  # its cooldown entry before this send
+
+
+class MacroEngine:
+    """
+    The main engine that processes D-pad inputs and triggers quickchats.
+
+    Listens for D-pad direction sequences (e.g., UP + UP, LEFT + RIGHT)
+    and sends the corresponding quickchat message when a combo is detected.
+
+    Features:
+        - Multi-input combo detection (trie-based) with configurable timing window
+        - Automatic message variation to avoid repetition
+        - Cooldown system to prevent spam of identical messages
+        - Next message of every combo pre-rendered between inputs
+        - Persistent state across restarts (optional)
+        - Toggle on/off with PS button
+    """
+
+    def __init__(
+        self,
+        variation_picker: VariationPicker,
+        chat_settings: ChatSettings,
+        macro_settings: MacroSettings,
+        message_cooldown_s: float,
+        ascii_only: bool,
+        persist_path: Optional[str],
+        sender: Optional[ChatSender] = None,
+        clock: Callable[[], float] = time.monotonic,
+        macro_map: Optional[Mapping[Tuple[str, ...], str]] = None,
+        pack_watcher: Optional[PackWatcher] = None,
+        pad_profiles: Optional[Mapping[int, PadProfile]] = None,
+        priorities: Optional[Mapping[str, int]] = None,
+        wall_clock: Callable[[], float] = time.time,
+        templates: Optional[Mapping[str, CompiledTemplate]] = None,
+        lookahead: bool = True,
+    ) -> None:
+        self._variation_picker = variation_picker
+        self._pack_watcher = pack_watcher
+        # All timing (combo windows, debounce, cooldowns) uses `clock`, a
+        # monotonic clock by default, so wall-clock jumps can't break it.
+        # Only the persisted files use wall-clock time (see _to_wall).
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._chat_settings = chat_settings
+        self._sender = sender
+        self._macro_settings = macro_settings
+        self._recent = RecentMessageCache(cooldown_s=message_cooldown_s)
+        self._ascii_only = ascii_only
+        # With --ascii, every message's ASCII form is computed up front
+        self._ascii: Optional[AsciiCache] = None
+        if ascii_only:
+            self._ascii = AsciiCache()
+            self._report_ascii_problems(self._ascii.prime(variation_picker.variations))
+        self._persist_path = persist_path
+        self._journal = CooldownJournal(persist_path) if persist_path else None
+        self._macros_enabled = True
+
+        # Delivery outcomes reported by the sender's thread, settled by
+        # housekeeping() on this one
+        self._outcomes: Deque[Tuple[QueuedSend, bool]] = deque()
+        if sender is not None:
+            sender.on_done = self._on_delivery_outcome
+
+        # Input tracking state
+        self._last_sent_message: str = ""
+        self._last_toggle_time: float = float("-inf")
+
+        self._macros: Dict[Tuple[str, ...], str] = dict(macro_map if macro_map is not None else macros)
+
+        # Build the combo trie once; per-input matching is then O(1)
+        self._combos = build_combo_trie(self._macros, window_s=macro_settings.macro_window_s)
+
+        # Compile every macro template up front: parsing happens once here,
+        # and a typo in a category name or modifier fails at startup.
+        # Templates compiled ahead of time (e.g. from a bundle) are reused.
+        self._templates = TemplateCache(resolve_key=self._variation_picker.resolve_key)
+        if templates:
+            self._templates.seed(templates)
+        for template in self._macros.values():
+            self._templates.get(template)
+
+        # Send priority per category (canonical names) and per template
+        self._priorities: Dict[str, int] = {}
+        self._template_priorities: Dict[str, int] = {}
+        self._set_priorities(category_priorities if priorities is None else priorities)
+
+        # Combo progress is tracked per controller (keyed by SDL instance id)
+        # so two pads' inputs never mix into one combo. Pads with their own
+        # macros get their own trie; everyone else shares self._combos.
+        self._pad_profiles: Dict[int, PadProfile] = dict(pad_profiles or {})
+        self._pad_combos: Dict[int, ComboTrie] = self._build_pad_combos(strict=True)
+        self._pads: Dict[int, PadState] = {}
+
+        # Messages rendered ahead of time (filled in by housekeeping())
+        self._lookahead: Optional[LookaheadBuffer] = (
+            LookaheadBuffer(undeal=variation_picker.undeal) if lookahead else None
+        )
+        self._reset_lookahead()
+
+        # Try to restore state from previous session
+        self._load_persisted_state()
+        if self._journal is not None:
+            self._journal.start()
+
+    @property
+    def macros(self) -> Mapping[Tuple[str, ...], str]:
+        """The macro table (input sequence -> template), read-only."""
+        return self._macros
+
+    @property
+    def lookahead(self) -> Optional[LookaheadBuffer]:
+        """The pre-render buffer (None if disabled), for its stats."""
+        return self._lookahead
+
+    def _load_persisted_state(self) -> None:
+        """
+        Load previously saved state (cooldown history, last message,
+        shuffle-bag positions).
+
+        This allows the cooldown system to work across restarts -
+        you won't immediately repeat a message you just sent before
+        restarting the script. The snapshot is loaded first, then any
+        messages in the journal (sent after that snapshot) are replayed
+        on top of it.
         """
         if not self._persist_path:
             return
+        parsed: List[Tuple[str, float]] = []
         try:
             with open(self._persist_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             last_sent = data.get("last_sent_message")
             if isinstance(last_sent, str):
                 self._last_sent_message = last_sent
+            picker_state = data.get("picker_state")
+            if isinstance(picker_state, dict):
+                self._variation_picker.restore_state(picker_state)
             entries = data.get("recent_messages")
             if isinstance(entries, list):
-                parsed: List[Tuple[str, float]] = []
                 for item in entries:
                     if (
                         isinstance(item, list)
@@ -978,137 +3548,1465 @@ class MacroEngine:
                         and isinstance(item[1], (int, float))
                     ):
                         parsed.append((item[0], float(item[1])))
-                self._recent._entries = parsed[-self._recent.max_entries:]
         except FileNotFoundError:
-            return
+            pass
         except Exception as e:
             print(f"Warning: failed to load persisted state from {self._persist_path!r}: {e}")
+        try:
+            for message, t in read_journal(self._persist_path + ".journal"):
+                parsed.append((message, t))
+                self._last_sent_message = message
+        except Exception as e:
+            print(f"Warning: failed to replay journal for {self._persist_path!r}: {e}")
+        # Files hold wall-clock times; the cache works in engine-clock time
+        offset = self._wall_clock() - self._clock()
+        self._recent.load([(message, t - offset) for message, t in parsed])
+
+    def _to_wall(self, t: float) -> float:
+        """
+        Convert an engine-clock time to wall-clock (Unix) time.
+
+        The offset is taken fresh on every call, so "now" always maps to
+        "now" and the age of a cooldown entry survives the round trip
+        through the files, even across restarts and reboots.
+        """
+        return t + (self._wall_clock() - self._clock())
+
+    def _from_wall(self, t: float) -> float:
+        """Convert a wall-clock (Unix) time to engine-clock time."""
+        return t - (self._wall_clock() - self._clock())
+
+    def _snapshot_payload(self) -> Dict[str, object]:
+        """Current cooldown and shuffle-bag state in the snapshot file format."""
+        offset = self._wall_clock() - self._clock()
+        return {
+            "last_sent_message": self._last_sent_message,
+            "recent_messages": [[m, t + offset] for (m, t) in self._recent.entries()],
+            # Values dealt for messages still in the lookahead buffer weren't
+            # sent; they're saved as still in their bags
+            "picker_state": self._variation_picker.export_state(
+                self._lookahead.dealt() if self._lookahead is not None else ()
+            ),
+        }
+
+    def housekeeping(self) -> None:
+        """
+        Periodic background work, called by the main loop between events.
+
+        Settles messages the sender has delivered or dropped, swaps in
+        reloaded message packs, pre-renders the next message of combos that
+        don't have one ready, and compacts the cooldown journal once it has
+        grown enough.
+        """
+        if self._outcomes:
+            self._settle_outcomes()
+        if self._pack_watcher is not None:
+            update = self._pack_watcher.poll()
+            if update is not None:
+                self.apply_corpus(update)
+        if self._lookahead is not None:
+            self._refill_lookahead()
+        if self._journal is not None and self._journal.needs_compaction():
+            self._journal.compact(self._snapshot_payload())
+
+    def apply_corpus(self, update: CorpusUpdate) -> None:
+        """
+        Swap in a reloaded corpus built by a PackWatcher.
+
+        Everything expensive (parsing, validation, the trie, template
+        compilation) was done on the watcher's thread; this only swaps
+        references. Shuffle bags are kept for unchanged categories, and a
+        combo in progress is only reset if the macro table changed.
+        """
+        corpus = update.corpus
+        self._variation_picker.update_variations(corpus.variations)
+        templates = TemplateCache(resolve_key=self._variation_picker.resolve_key)
+        templates.seed(corpus.templates)
+        self._templates = templates
+        self._set_priorities(corpus.priorities)
+        if self._ascii is not None:
+            self._report_ascii_problems(
+                self._ascii.prime({k: corpus.variations[k] for k in update.changed_categories})
+            )
+        if update.combos is not None:
+            self._macros = dict(corpus.macros)
+            self._combos = update.combos
+        if update.combos is not None or any(p.macros for p in self._pad_profiles.values()):
+            self._pad_combos = self._build_pad_combos(strict=False)
+            self._pads.clear()
+        self._reset_lookahead()
+        parts = [f"{len(update.changed_categories)} categories changed"]
+        if update.removed_categories:
+            parts.append(f"{len(update.removed_categories)} removed")
+        if update.combos is not None:
+            parts.append(f"{len(self._macros)} macros")
+        print(f"Reloaded message packs: {', '.join(parts)}")
+
+    @staticmethod
+    def _report_ascii_problems(problems: Sequence[str], limit: int = 10) -> None:
+        """Print the messages that --ascii empties or mangles."""
+        for problem in problems[:limit]:
+            print(f"Warning: --ascii: {problem}")
+        if len(problems) > limit:
+            print(f"Warning: --ascii: ...and {len(problems) - limit} more messages affected")
+
+    def _set_priorities(self, priorities: Mapping[str, int]) -> None:
+        """Index category priorities by canonical category name."""
+        resolved: Dict[str, int] = {}
+        for key, priority in priorities.items():
+            try:
+                resolved[self._variation_picker.resolve_key(key)] = priority
+            except KeyError:
+                print(f'Warning: priority set for unknown category "{key}"; ignored')
+        self._priorities = resolved
+        self._template_priorities = {}
+
+    def _priority(self, compiled: CompiledTemplate) -> int:
+        """Send priority of a template: the highest of its categories'."""
+        priority = self._template_priorities.get(compiled.source)
+        if priority is None:
+            priority = max(
+                (self._priorities.get(slot.key, PRIORITY_NORMAL) for slot in compiled.slots),
+                default=PRIORITY_NORMAL,
+            )
+            self._template_priorities[compiled.source] = priority
+        return priority
+
+    def _build_pad_combos(self, strict: bool) -> Dict[int, ComboTrie]:
+        """
+        Build the combo tries of pads that have their own macros.
+
+        With strict=False (used on reload), a pad macro whose template no
+        longer compiles is skipped with a warning instead of raising.
+        """
+        pad_combos: Dict[int, ComboTrie] = {}
+        for instance_id, profile in self._pad_profiles.items():
+            if not profile.macros:
+                continue
+            table = dict(self._macros)
+            for sequence, template in profile.macros.items():
+                if not template:
+                    table.pop(sequence, None)
+                    continue
+                try:
+                    self._templates.get(template)
+                except (KeyError, ValueError) as e:
+                    if strict:
+                        raise
+                    print(f"Warning: pad {instance_id} macro {sequence} disabled: {e}")
+                    continue
+                table[sequence] = template
+            pad_combos[instance_id] = build_combo_trie(table, window_s=self._macro_settings.macro_window_s)
+        return pad_combos
+
+    def _pad(self, instance_id: int) -> PadState:
+        """The state of a controller, created on its first input."""
+        pad = self._pads.get(instance_id)
+        if pad is None:
+            profile = self._pad_profiles.get(instance_id)
+            combos = self._pad_combos.get(instance_id, self._combos)
+            pad = self._pads[instance_id] = PadState(
+                matcher=ComboMatcher(combos, min_gap_s=self._macro_settings.macro_min_gap_s),
+                chat_mode=profile.chat_mode if profile is not None else None,
+            )
+        return pad
+
+    def _reset_lookahead(self) -> None:
+        """Empty the pre-render buffer and point it at the current macros."""
+        if self._lookahead is None:
+            return
+        templates: Dict[str, None] = dict.fromkeys(self._macros.values())
+        for profile in self._pad_profiles.values():
+            templates.update(dict.fromkeys((profile.macros or {}).values()))
+        self._lookahead.reset(templates)
+
+    def _refill_lookahead(self) -> None:
+        """Pre-render messages for (some of) the templates that need one."""
+        lookahead = self._lookahead
+        assert lookahead is not None
+        now = self._clock()
+        wanted = lookahead.wanted(LOOKAHEAD_REFILL_PER_TICK, now)
+        if not wanted:
+            return
+        stats = STATS
+        for template in wanted:
+            t0 = time.perf_counter() if stats is not None else 0.0
+            picks: List[Tuple[str, str]] = []
+            try:
+                message = self._render(template, now, prerender=True, picks=picks)
+            except (KeyError, ValueError):
+                message = ""  # A pad macro disabled on reload
+            if message:
+                lookahead.put(template, message, picks)
+            elif message is not None:
+                lookahead.park(template, float("inf"))
+            if stats is not None:
+                stats.record("prerender", time.perf_counter() - t0)
+
+    def forget_pad(self, instance_id: int) -> None:
+        """Drop a disconnected controller's combo state."""
+        self._pads.pop(instance_id, None)
+
+    def save_persisted_state(self) -> None:
+        """
+        Save current state to disk for restoration after restart.
+
+        Called automatically when the script exits cleanly. Writes a final
+        snapshot (atomically) and empties the journal.
+        """
+        if not self._persist_path:
+            return
+        self._settle_outcomes()
+        try:
+            if self._journal is not None:
+                self._journal.close(self._snapshot_payload())
+            else:
+                write_snapshot(self._persist_path, self._snapshot_payload())
+        except Exception as e:
+            print(f"Warning: failed to save persisted state to {self._persist_path!r}: {e}")
+
+    def toggle(self, now: Optional[float] = None) -> None:
+        """
+        Toggle macros on/off (called when PS button is pressed).
+
+        Args:
+            now: When the press happened (engine clock); defaults to now
+        """
+        if now is None:
+            now = self._clock()
+        # Debounce to prevent rapid toggling
+        if now - self._last_toggle_time < 0.25:
+            return
+        self._last_toggle_time = now
+        self._macros_enabled = not self._macros_enabled
+        if not self._macros_enabled and self._sender is not None:
+            # Stop typing right away, and don't send anything still queued
+            self._sender.cancel()
+        state = "on" if self._macros_enabled else "off"
+        print(f"----- quickchat macros toggled {state} -----")
+
+    def handle_action(
+        self,
+        action: str,
+        received_at: Optional[float] = None,
+        instance_id: int = 0,
+        event_time: Optional[float] = None,
+    ) -> None:
+        """
+        Process a D-pad or button action.
+
+        D-pad directions and buttons are fed to the combo matcher of the
+        controller they came from, which triggers the corresponding macro
+        when a full sequence is entered.
+
+        For the PS button (on any pad), this toggles macros on/off.
+
+        Args:
+            action: The action name (D-pad direction or BUTTONS key)
+            received_at: time.perf_counter() when the event loop dequeued
+                         the input; only used for --stats
+            instance_id: SDL instance id of the controller
+            event_time: When the input happened, on the engine's clock.
+                        Combo windows are measured between these. With
+                        evdev input it's the kernel's timestamp, so loop
+                        lag doesn't count; pygame events have no timestamp
+                        and are dated when dequeued. Defaults to the
+                        clock's current time.
+        """
+        # PS button toggles macros
+        if event_time is None:
+            event_time = self._clock()
+        if action == "ps":
+            self.toggle(event_time)
+            return
+
+        # If macros are disabled, ignore inputs
+        if not self._macros_enabled:
+            return
+
+        stats = STATS
+        if stats is None:
+            pad = self._pad(instance_id)
+            template = pad.matcher.feed(action, event_time)
+            if template:
+                self._send_template(template, pad.chat_mode, event_time)
+            return
+
+        t0 = time.perf_counter()
+        pad = self._pad(instance_id)
+        template = pad.matcher.feed(action, event_time)
+        t1 = time.perf_counter()
+        stats.record("match", t1 - t0)
+        if received_at is not None:
+            stats.record("dequeue_to_match", t1 - received_at)
+        if template:
+            self._send_template(template, pad.chat_mode, event_time)
+            stats.record("combo_to_queued", time.perf_counter() - t1)
+
+    def _send_template(self, template: str, chat_mode: Optional[str] = None, now: Optional[float] = None) -> None:
+        """
+        Send the next message for a template as a chat message.
+
+        The message pre-rendered by the lookahead buffer is used if there is
+        one and it hasn't gone on cooldown since; otherwise it's rendered
+        now.
+        """
+        if now is None:
+            now = self._clock()
+        stats = STATS
+        message: Optional[str] = None
+        picks: Sequence[Tuple[str, str]] = ()
+        lookahead = self._lookahead
+        if lookahead is not None:
+            t0 = time.perf_counter() if stats is not None else 0.0
+            message, picks = lookahead.take(template, lambda text: not self._on_cooldown(text, now))
+            if stats is not None:
+                stats.record("lookahead_take", time.perf_counter() - t0)
+        if message is None:
+            message = self._render(template, now)
+        if not message:
+            return
+        queued = QueuedSend(message, now, self._recent.sent_at(message))
+        if not self._deliver(message, chat_mode, self._priority(self._templates.get(template)), template, queued):
+            # Coalesced or dropped: it won't be sent, so it doesn't count,
+            # and a pre-rendered message's values go back into their bags
+            if lookahead is not None and picks:
+                lookahead.give_back(picks)
+            return
+        self._recent.add(message, now)
+        if lookahead is not None:
+            lookahead.discard_message(message)
+        if self._sender is None:
+            self._settle(queued, True)  # Already typed inline
+
+    def _on_delivery_outcome(self, item: PendingChat, delivered: bool) -> None:
+        """ChatSender.on_done: runs on the sender's thread, so only queues the outcome."""
+        if isinstance(item.tag, QueuedSend):
+            self._outcomes.append((item.tag, delivered))
+
+    def _settle_outcomes(self) -> None:
+        """Settle every delivery outcome the sender has reported so far."""
+        outcomes = self._outcomes
+        while outcomes:
+            queued, delivered = outcomes.popleft()
+            self._settle(queued, delivered)
+
+    def _settle(self, queued: QueuedSend, delivered: bool) -> None:
+        """
+        Journal a delivered message, or take back the cooldown of one the
+        sender dropped (stale, evicted, cancelled or failed).
+        """
+        if delivered:
+            self._last_sent_message = queued.message
+            if self._journal is not None:
+                self._journal.append(queued.message, self._to_wall(queued.sent_at))
+        else:
+            self._recent.discard(queued.message, queued.sent_at, queued.previous_sent_at)
+
+    def _on_cooldown(self, message: str, now: float) -> bool:
+        """True if a message can't be sent now (empty, or sent recently)."""
+        return not message or message == self._last_sent_message or self._recent.seen_recently(message, now)
+
+    def _render(
+        self,
+        template: str,
+        now: float,
+        prerender: bool = False,
+        picks: Optional[List[Tuple[str, str]]] = None,
+    ) -> Optional[str]:
+        """
+        Render a template into a finished message.
+
+        The last placeholder in the template is picked with a cooldown
+        filter, so the picker only deals values that produce a message we
+        haven't sent recently - one render is enough. If every value in
+        that category is on cooldown, a repeat is sent and a note printed.
+
+        Args:
+            prerender: Rendering ahead of time for the lookahead buffer. If
+                       everything is on cooldown, the template is parked in
+                       the buffer until the first message frees up and None
+                       is returned instead of a repeat. Not timed as part of
+                       the input path.
+            picks: If given, every (category, value) dealt from a shuffle
+                   bag is appended to it (nothing, if None is returned)
+
+        Returns:
+            The message ("" if there's nothing sendable)
+        """
+        stats = STATS if not prerender else None
+        t0 = time.perf_counter() if stats is not None else 0.0
+        compiled = self._templates.get(template)
+        picker = self._variation_picker
+        dealt = picks if picks is not None else []
+
+        def recording_pick(key: str, exclude: Optional[Callable[[str], bool]] = None) -> str:
+            value = picker.pick(key, exclude)
+            dealt.append((picker.resolve_key(key), value))
+            return value
+
+        pick = recording_pick if picks is not None else picker.pick
+        prefix, slot, suffix = compiled.render_split(pick)
+        if stats is not None:
+            stats.record("render", time.perf_counter() - t0)
+
+        ascii_cache = self._ascii
+        if ascii_cache is not None:
+            # Picked values are ASCII-converted from the cache primed at load
+            # time; the rest of the message is converted once per send here.
+            t = time.perf_counter() if stats is not None else 0.0
+            prefix, suffix = ascii_cache.get(prefix), ascii_cache.get(suffix)
+            if stats is not None:
+                stats.record("normalize_ascii", time.perf_counter() - t)
+
+        def finish(text: str) -> str:
+            if ascii_cache is not None:
+                text = ascii_cache.get(text)
+            if slot is not None and slot.transform:
+                text = slot.transform(text)
+            return (prefix + text + suffix).strip()
+
+        def blocked(text: str) -> bool:
+            t = time.perf_counter() if stats is not None else 0.0
+            result = self._on_cooldown(finish(text), now)
+            if stats is not None:
+                stats.record("cooldown_check", time.perf_counter() - t)
+            return result
+
+        t0 = time.perf_counter() if stats is not None else 0.0
+        if slot is None:
+            message = finish("")
+        else:
+            try:
+                message = finish(pick(slot.key, exclude=blocked))
+            except CategoryExhausted as e:
+                if prerender:
+                    assert self._lookahead is not None
+                    for key, value in reversed(picks or ()):
+                        picker.undeal(key, value)
+                    if picks:
+                        picks.clear()
+                    retry_at = min(
+                        (self._recent.expires_at(finish(text)) for text in self._variation_picker.variations[e.key]),
+                        default=now,
+                    )
+                    self._lookahead.park(template, max(retry_at, now + LOOKAHEAD_RETRY_S))
+                    return None
+                print(f'Note: all {e.size} "{e.key}" messages are on cooldown; sending a repeat.')
+                try:
+                    message = finish(pick(slot.key, exclude=lambda text: not finish(text)))
+                except CategoryExhausted:
+                    message = ""  # Every message is empty (flagged at load with --ascii)
+        if stats is not None:
+            stats.record("pick", time.perf_counter() - t0)
+        return message
+
+    def _deliver(
+        self,
+        message: str,
+        chat_mode: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL,
+        key: Optional[str] = None,
+        tag: Optional[QueuedSend] = None,
+    ) -> bool:
+        """
+        Hand a finished message to the sender.
+
+        With a background sender this only queues the message, so the
+        controller loop is never blocked by typing. Without one, the
+        message is typed inline (the old behaviour).
+
+        Args:
+            tag: Cooldown bookkeeping, handed back by the sender once the
+                 message was delivered or dropped
+
+        Returns:
+            False if the sender didn't accept the message
+        """
+        if self._sender is not None:
+            return self._sender.submit(message, chat_mode, priority, key, tag)
+        settings = self._chat_settings
+        if chat_mode is not None and chat_mode != settings.chat_mode:
+            settings = replace(settings, chat_mode=chat_mode)
+        send_chat(message, settings)
+        print(f"Sent quick chat: {message}")
+        return True
+
+
+# =============================================================================
+# EVENT LOOP
+# =============================================================================
+# Two ways to read controller events:
+#
+#   - "poll": grab whatever is queued, then sleep 5 ms. Simple, but every press
+#     can sit in the queue for up to 5 ms (plus OS timer slop), and the process
+#     wakes up 200 times a second even when nothing is happening.
+#   - "wait": block inside SDL until an event arrives. Presses are handled as
+#     soon as they happen and the process sleeps while idle. The wait has a
+#     timeout so the loop still comes up for air regularly (Ctrl+C handling
+#     and other housekeeping).
+#
+# --loop-stats measures both: idle CPU usage of the process, and how long an
+# event sits in the queue before the loop dispatches it (using probe events
+# posted from a background thread).
+# =============================================================================
+
+LOOP_MODES: Tuple[str, ...] = ("wait", "poll")
+LOOP_POLL_SLEEP_S = 0.005      # Sleep between passes in "poll" mode
+LOOP_WAIT_TIMEOUT_MS = 250     # Max time to block in "wait" mode
+LOOP_PROBE_INTERVAL_S = 0.25   # How often --loop-stats posts a probe event
+
+
+def next_events(loop_mode: str) -> List[pygame.event.Event]:
+    """
+    Return the next batch of pygame events using the given loop mode.
+
+    In "wait" mode this blocks until at least one event arrives (or the
+    housekeeping timeout expires, in which case the batch is empty).
+    """
+    if loop_mode == "poll":
+        time.sleep(LOOP_POLL_SLEEP_S)
+        return pygame.event.get()
+    first = pygame.event.wait(LOOP_WAIT_TIMEOUT_MS)
+    if first.type == pygame.NOEVENT:
+        return []
+    # Drain anything else that arrived together with the first event
+    return [first] + pygame.event.get()
+
+
+class LoopStats:
+    """
+    Measures idle CPU usage and event dispatch latency of the main loop.
+
+    A background thread posts a probe event carrying the time it was
+    posted. When the main loop dispatches the probe, the difference is the
+    time an event spends waiting in the queue - exactly the delay a real
+    button press would see.
+    """
+
+    def __init__(self, loop_mode: str) -> None:
+        self.loop_mode = loop_mode
+        self.probe_type = pygame.USEREVENT
+        self._latencies: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+
+    def start(self) -> None:
+        """Start the CPU clock and the probe thread."""
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._post_probes, name="quickchat-loop-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop posting probes."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def _post_probes(self) -> None:
+        while not self._stop.wait(LOOP_PROBE_INTERVAL_S):
+            try:
+                pygame.event.post(pygame.event.Event(self.probe_type, posted_at=time.perf_counter()))
+            except Exception:
+                return
+
+    def note_probe(self, event: pygame.event.Event) -> None:
+        """Record the dispatch latency of a probe event."""
+        self._latencies.append(time.perf_counter() - float(event.posted_at))
+
+    def summary(self) -> str:
+        """Human readable report (printed on exit)."""
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.process_time() - self._cpu_start
+        cpu_pct = (cpu / wall * 100.0) if wall > 0 else 0.0
+        lines = [
+            f"Loop mode: {self.loop_mode}",
+            f"  CPU: {cpu:.3f} s over {wall:.1f} s wall ({cpu_pct:.2f}% of one core)",
+        ]
+        if self._latencies:
+            ordered = sorted(self._latencies)
+            p50 = ordered[len(ordered) // 2]
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            lines.append(
+                f"  Dispatch latency ({len(ordered)} probes): "
+                f"p50={p50 * 1000.0:.2f} ms p99={p99 * 1000.0:.2f} ms max={ordered[-1] * 1000.0:.2f} ms"
+            )
+        else:
+            lines.append("  Dispatch latency: no probes recorded")
+        return "\n".join(lines)
+
+
+# =============================================================================
+# EVENT RECORDING & REPLAY
+# =============================================================================
+# Controller events are converted into small ControllerEvent records before
+# they're dispatched. The same records can be written to a file (--record)
+# and later pushed back through the same dispatch path (--replay), either in
+# real time or sped up. Handy for reproducing a missed combo from a real match
+# or load-testing the engine without a controller.
+#
+# FILE FORMAT (little-endian):
+#   Header:  b"RLQC", version (u8), 3 reserved bytes
+#   Records: kind (u8), time in ms since recording start (u32),
+#            instance id (i16), a (i8), b (i8)                   = 9 bytes
+#
+#   kind  a               b
+#   1     button number   0        (button down)
+#   2     button number   0        (button up)
+#   3     hat x           hat y    (hat motion)
+#   4     device index    0        (controller added)
+#   5     0               0        (controller removed)
+#
+# Records are appended as they happen and read back one block at a time, so
+# hour-long sessions never have to fit in memory.
+# =============================================================================
+
+EVENT_BUTTON_DOWN = 1
+EVENT_BUTTON_UP = 2
+EVENT_HAT = 3
+EVENT_DEVICE_ADDED = 4
+EVENT_DEVICE_REMOVED = 5
+
+RECORDING_MAGIC = b"RLQC"
+RECORDING_VERSION = 1
+_RECORDING_HEADER = struct.Struct("<4sB3x")
+_RECORDING_RECORD = struct.Struct("<BIhbb")
+
+
+class ControllerEvent(NamedTuple):
+    """
+    A controller event, independent of where it came from.
+
+    Attributes:
+        kind: One of the EVENT_* constants
+        t: Time the event happened, in seconds (live events: on the
+           time.monotonic() clock; recordings: since the first event)
+        instance_id: Which controller it came from
+        a: Button number, hat x, or device index (depends on kind)
+        b: Hat y (0 for other kinds)
+    """
+    kind: int
+    t: float
+    instance_id: int = 0
+    a: int = 0
+    b: int = 0
+
+
+def controller_event_from_pygame(event: "pygame.event.Event", t: float) -> Optional[ControllerEvent]:
+    """
+    Convert a pygame joystick event into a ControllerEvent.
+
+    Returns:
+        The converted event, or None for events we don't care about
+    """
+    instance_id = int(getattr(event, "instance_id", getattr(event, "joy", 0)))
+    if event.type == pygame.JOYBUTTONDOWN:
+        return ControllerEvent(EVENT_BUTTON_DOWN, t, instance_id, int(event.button))
+    if event.type == pygame.JOYBUTTONUP:
+        return ControllerEvent(EVENT_BUTTON_UP, t, instance_id, int(event.button))
+    if event.type == pygame.JOYHATMOTION:
+        x, y = event.value
+        return ControllerEvent(EVENT_HAT, t, instance_id, int(x), int(y))
+    if event.type == pygame.JOYDEVICEADDED:
+        return ControllerEvent(EVENT_DEVICE_ADDED, t, instance_id, int(event.device_index))
+    if event.type == pygame.JOYDEVICEREMOVED:
+        return ControllerEvent(EVENT_DEVICE_REMOVED, t, instance_id)
+    return None
+
+
+def dispatch_controller_event(
+    event: ControllerEvent,
+    engine: "MacroEngine",
+    button_to_action: Mapping[int, str],
+    received_at: Optional[float] = None,
+) -> None:
+    """
+    Feed one controller event to the engine.
+
+    This is the single dispatch path shared by live input and replays.
+    Inputs are routed by the controller's instance id, so every pad has
+    its own combo state. Button-up and device-added events don't trigger
+    anything; a removed device's combo state is dropped.
+    """
+    if event.kind == EVENT_BUTTON_DOWN:
+        # Controllers that expose the D-pad as buttons land here too
+        action = button_to_action.get(event.a)
+    elif event.kind == EVENT_HAT:
+        action = hat_to_dpad_action((event.a, event.b))
+    elif event.kind == EVENT_DEVICE_REMOVED:
+        engine.forget_pad(event.instance_id)
+        return
+    else:
+        return
+    if action:
+        engine.handle_action(action, received_at, event.instance_id, event.t)
+
+
+class EventRecorder:
+    """
+    Appends ControllerEvents to a recording file as they happen.
+
+    Writes are buffered and flushed at least once a second, so a crash loses
+    at most the last second of input.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "wb")
+        self._file.write(_RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION))
+        self._start: Optional[float] = None
+        self._last_flush = time.monotonic()
+        self.count = 0
+
+    def write(self, event: ControllerEvent) -> None:
+        """Append one event (its time is stored relative to the first event)."""
+        if self._start is None:
+            self._start = event.t
+        ms = max(0, min(0xFFFFFFFF, int(round((event.t - self._start) * 1000.0))))
+        self._file.write(
+            _RECORDING_RECORD.pack(
+                event.kind,
+                ms,
+                max(-32768, min(32767, event.instance_id)),
+                max(-128, min(127, event.a)),
+                max(-128, min(127, event.b)),
+            )
+        )
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_flush >= 1.0:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if not self._file.closed:
+            self._file.close()
+
+
+def open_recording(path: str) -> BinaryIO:
+    """
+    Open a recording file and check its header.
+
+    Returns:
+        The file, positioned at the first event (see iter_recording)
+
+    Raises:
+        OSError: If the file can't be opened
+        ValueError: If the file isn't a recording (or is a newer version)
+    """
+    f = open(path, "rb")
+    try:
+        header = f.read(_RECORDING_HEADER.size)
+        if len(header) < _RECORDING_HEADER.size:
+            raise ValueError(f"{path!r} is not a quickchat recording (too short)")
+        magic, version = _RECORDING_HEADER.unpack(header)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f"{path!r} is not a quickchat recording")
+        if version != RECORDING_VERSION:
+            raise ValueError(f"{path!r} uses recording format v{version}; this script reads v{RECORDING_VERSION}")
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def iter_recording(f: BinaryIO) -> Iterator[ControllerEvent]:
+    """Stream the events of a recording opened by open_recording(), oldest first (closes it at the end)."""
+    with f:
+        size = _RECORDING_RECORD.size
+        while True:
+            block = f.read(size * 4096)
+            if not block:
+                return
+            # A torn final record (e.g. after a crash) is silently dropped
+            usable = len(block) - len(block) % size
+            for kind, ms, instance_id, a, b in _RECORDING_RECORD.iter_unpack(block[:usable]):
+                yield ControllerEvent(kind, ms / 1000.0, instance_id, a, b)
+            if usable < len(block):
+                return
+
 
-    def save_persisted_state(self) -> None:
+def read_recording(path: str) -> Iterator[ControllerEvent]:
+    """
+    Stream the events of a recording file, oldest first.
+
+    Raises:
+        OSError: If the file can't be opened
+        ValueError: If the file isn't a recording (or is a newer version)
+    """
+    return iter_recording(open_recording(path))
+
+
+class ReplayClock:
+    """
+    Clock that follows the recording's timeline instead of the real one.
+
+    The engine measures combo gaps with this, so a replay at 50x speed still
+    sees the original 150 ms between presses.
+    """
+
+    def __init__(self, base: float) -> None:
+        self.base = base
+        self.now = base
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# =============================================================================
+# INPUT SOURCES
+# =============================================================================
+# The engine doesn't care where inputs come from. Every source turns its
+# input into ControllerEvents dated on its own clock (which the engine then
+# uses too), and run_input_loop() feeds them through dispatch_controller_event
+# exactly like a live controller:
+#
+#   - pygame: live controllers (the default)
+#   - stdin:  typed or piped text, e.g. `up up` or `2:left L1` (--input stdin)
+#   - evdev:  Linux input devices read directly (--input evdev; see EVDEV INPUT)
+#   - replay: a --record file (--replay)
+#   - queue:  inputs pushed from code (tests, load generators)
+#
+# Only the pygame source needs pygame or a controller, so the rest run on a
+# plain headless box.
+#
+# Text inputs have no timestamps of their own. They are dated by a
+# PacedClock: real time, but never closer together than --input-gap. Piped
+# input therefore runs as fast as the engine can take it, while combo windows,
+# debouncing and cooldowns see a believable pace (10,000 inputs at 100 ms
+# cover about 17 minutes of play).
+# =============================================================================
+
+INPUT_SOURCES: Tuple[str, ...] = ("pygame", "stdin", "evdev")
+INPUT_GAP_S = 0.1  # Default spacing of undated inputs (see PacedClock)
+
+# D-pad directions as hat values (the inverse of hat_to_dpad_action)
+DPAD_HAT_VALUES: Mapping[str, Tuple[int, int]] = {
+    "up": (0, 1),
+    "down": (0, -1),
+    "left": (-1, 0),
+    "right": (1, 0),
+}
+
+
+def parse_input_token(token: str) -> Tuple[str, int]:
+    """
+    Parse one text input: an input name, optionally prefixed by a pad
+    number ("up", "L1", "2:left").
+
+    Returns:
+        (input name, pad instance id)
+
+    Raises:
+        ValueError: If the pad number or the input name is invalid
+    """
+    pad, sep, name = token.rpartition(":")
+    try:
+        instance_id = int(pad) if sep else 0
+    except ValueError:
+        raise ValueError(f"bad pad number in {token!r}") from None
+    if name not in DPAD_HAT_VALUES and name not in BUTTONS:
+        raise ValueError(f"unknown input {name!r} (known: {sorted(set(DPAD_HAT_VALUES) | set(BUTTONS))})")
+    return name, instance_id
+
+
+def input_event(name: str, t: float, instance_id: int = 0) -> ControllerEvent:
+    """The ControllerEvent for pressing an input (a hat move for directions)."""
+    hat = DPAD_HAT_VALUES.get(name)
+    if hat is not None:
+        return ControllerEvent(EVENT_HAT, t, instance_id, hat[0], hat[1])
+    return ControllerEvent(EVENT_BUTTON_DOWN, t, instance_id, BUTTONS[name])
+
+
+class PacedClock:
+    """
+    Clock for inputs that don't carry their own time.
+
+    Follows time.monotonic(), except that next_input() never dates two
+    inputs less than `gap_s` apart; inputs arriving faster than that move
+    the clock ahead of real time.
+    """
+
+    def __init__(self, gap_s: float = INPUT_GAP_S) -> None:
+        self.gap_s = gap_s
+        self._last = float("-inf")
+
+    def __call__(self) -> float:
+        return max(time.monotonic(), self._last)
+
+    def next_input(self) -> float:
+        """Date the next input."""
+        self._last = max(time.monotonic(), self._last + self.gap_s)
+        return self._last
+
+
+class InputSource:
+    """
+    Base class for input sources.
+
+    Subclasses implement poll(); open() and close() are optional. `clock`
+    is the clock events are dated on; the engine must use the same one.
+    """
+
+    name = "base"
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+
+    def open(self) -> None:
+        """Start reading (called once, before the first poll)."""
+
+    def poll(self) -> Optional[List[ControllerEvent]]:
         """
-        Save current state to disk for restoration after restart.
+        Wait briefly for input.
 
-        Called automatically when the script exits cleanly.
+        Returns:
+            The events that arrived (possibly none, so the caller gets to do
+            housekeeping), or None once the source has run out
         """
-        if not self._persist_path:
-            return
-        try:
-            os.makedirs(os.path.dirname(self._persist_path) or ".", exist_ok=True)
-            payload = {
-                "last_sent_message": self._last_sent_message,
-                "recent_messages": [[m, t] for (m, t) in self._recent._entries],
-            }
-            with open(self._persist_path, "w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"Warning: failed to save persisted state to {self._persist_path!r}: {e}")
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release whatever the source holds."""
+
+
+class PygameSource(InputSource):
+    """Live controller events from pygame."""
+
+    name = "pygame"
+
+    def __init__(self, loop_mode: str, loop_stats: Optional[LoopStats] = None) -> None:
+        super().__init__(time.monotonic)
+        self.loop_mode = loop_mode
+        self.loop_stats = loop_stats
+
+    def poll(self) -> Optional[List[ControllerEvent]]:
+        events = next_events(self.loop_mode)
+        # pygame's Event objects don't carry SDL's event timestamp (neither
+        # pygame 2.6 nor pygame-ce 2.5 exposes it), so a batch is dated when
+        # it was dequeued. In "wait" mode that's as soon as its first event
+        # arrived; time spent handling earlier batches still counts. For
+        # kernel-stamped presses, use --input evdev.
+        now = time.monotonic()
+        loop_stats = self.loop_stats
+        converted: List[ControllerEvent] = []
+        for event in events:
+            if loop_stats is not None and event.type == loop_stats.probe_type:
+                loop_stats.note_probe(event)
+                continue
 
-    def toggle(self) -> None:
-        """Toggle macros on/off (called when PS button is pressed)."""
-        now = time.time()
-        # Debounce to prevent rapid toggling
-        if now - self._last_toggle_time < 0.25:
-            return
-        self._last_toggle_time = now
-        self._macros_enabled = not self._macros_enabled
-        state = "on" if self._macros_enabled else "off"
-        print(f"----- quickchat macros toggled {state} -----")
+            controller_event = controller_event_from_pygame(event, now)
+            if controller_event is None:
+                continue
+
+            # Handle controller connect/disconnect
+            if controller_event.kind == EVENT_DEVICE_ADDED:
+                try:
+                    js = pygame.joystick.Joystick(event.device_index)
+                    js.init()
+                    print(f"Controller added: #{js.get_id()}: {js.get_name()}")
+                except Exception:
+                    pass
+            elif controller_event.kind == EVENT_DEVICE_REMOVED:
+                print(f"Controller removed: instance_id={event.instance_id}")
+            converted.append(controller_event)
+        return converted
+
+    def close(self) -> None:
+        pygame.quit()
+
+
+class ReplaySource(InputSource):
+    """
+    Events from a --record file.
+
+    Event times are moved onto a ReplayClock's timeline, so combo windows
+    are measured between the recorded times whatever the replay speed.
+    """
 
-    def handle_action(self, action: str) -> None:
+    name = "replay"
+
+    def __init__(self, path: str, speed: float) -> None:
         """
-        Process a D-pad or button action.
+        Args:
+            path: Recording file
+            speed: 1.0 = real time, 10.0 = ten times faster, 0 = as fast as possible
+        """
+        self.replay_clock = ReplayClock(base=time.monotonic())
+        super().__init__(self.replay_clock)
+        self.path = path
+        self.speed = speed
+        self._file: Optional[BinaryIO] = None
+        self._events: Optional[Iterator[ControllerEvent]] = None
+        self._started = 0.0
+
+    def open(self) -> None:
+        # Opened and checked here, so a missing or bad file is reported
+        # before the engine starts
+        self._file = open_recording(self.path)
+        self._events = iter_recording(self._file)
+
+    def poll(self) -> Optional[List[ControllerEvent]]:
+        assert self._events is not None
+        event = next(self._events, None)
+        if event is None:
+            return None
+        if not self._started:
+            self._started = time.monotonic()
+        if self.speed > 0:
+            delay = self._started + event.t / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        clock = self.replay_clock
+        event = event._replace(t=clock.base + event.t)
+        clock.now = event.t
+        if event.kind == EVENT_DEVICE_ADDED:
+            print(f"[replay] Controller added: device_index={event.a}")
+        elif event.kind == EVENT_DEVICE_REMOVED:
+            print(f"[replay] Controller removed: instance_id={event.instance_id}")
+        # One event per batch, so housekeeping runs between inputs as live
+        return [event]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class QueueSource(InputSource):
+    """
+    Inputs pushed from code, from any thread.
+
+    Inputs pushed by name are dated by a PacedClock when they are taken off
+    the queue; ControllerEvents pushed with push_event() keep their own time
+    (on this source's clock).
+    """
+
+    name = "queue"
 
-        For D-pad directions, this builds up two-input combos and triggers
-        the corresponding macro when a valid combo is detected.
+    def __init__(self, gap_s: float = INPUT_GAP_S) -> None:
+        self.paced_clock = PacedClock(gap_s)
+        super().__init__(self.paced_clock)
+        self._queue: "queue.Queue[Union[ControllerEvent, Tuple[str, int], None]]" = queue.Queue()
+        self._finished = False
 
-        For the PS button, this toggles macros on/off.
+    def push(self, *names: str, instance_id: int = 0) -> None:
         """
-        # PS button toggles macros
-        if action == "ps":
-            self.toggle()
-            return
+        Queue inputs by name ("up", "L1", ...).
 
-        # If macros are disabled, ignore D-pad inputs
-        if not self._macros_enabled:
-            return
+        Raises:
+            ValueError: For an unknown input name
+        """
+        for name in names:
+            if name not in DPAD_HAT_VALUES and name not in BUTTONS:
+                raise ValueError(f"unknown input {name!r}")
+            self._queue.put((name, instance_id))
+
+    def push_event(self, event: ControllerEvent) -> None:
+        """Queue a ready-made event."""
+        self._queue.put(event)
+
+    def finish(self) -> None:
+        """No more input: poll() returns None once the queue is drained."""
+        self._queue.put(None)
+
+    def poll(self) -> Optional[List[ControllerEvent]]:
+        if self._finished:
+            return None
+        try:
+            item = self._queue.get(timeout=LOOP_WAIT_TIMEOUT_MS / 1000.0)
+        except queue.Empty:
+            return []
+        if item is None:
+            self._finished = True
+            return None
+        if not isinstance(item, ControllerEvent):
+            name, instance_id = item
+            item = input_event(name, self.paced_clock.next_input(), instance_id)
+        # One input per batch: on the paced timeline inputs are spread out,
+        # so housekeeping (e.g. lookahead refills) gets to run between them
+        return [item]
+
+
+class StdinSource(QueueSource):
+    """
+    Inputs typed or piped in as text, whitespace separated.
 
-        # Only process D-pad directions
-        if action not in ("up", "down", "left", "right"):
-            return
+    Each input is a name from BUTTONS ("up", "L1", "ps", ...), optionally
+    prefixed with a pad number ("2:up"). Lines starting with # are skipped.
+    The source ends at end of input.
+    """
 
-        now = time.time()
+    name = "stdin"
 
-        # First input of potential combo
-        if self._last_action is None:
-            self._last_action = action
-            self._last_action_time = now
-            return
+    def __init__(self, stream: TextIO, gap_s: float = INPUT_GAP_S) -> None:
+        super().__init__(gap_s)
+        self._stream = stream
+        self._thread: Optional[threading.Thread] = None
 
-        elapsed = now - self._last_action_time
+    def open(self) -> None:
+        # A thread, because Windows can't select() on a console or pipe
+        self._thread = threading.Thread(target=self._read, name="quickchat-stdin", daemon=True)
+        self._thread.start()
 
-        # Too slow? Reset and start a new potential combo
-        if elapsed > self._macro_settings.macro_window_s:
-            self._last_action = action
-            self._last_action_time = now
-            return
+    def _read(self) -> None:
+        try:
+            for line in self._stream:
+                if line.lstrip().startswith("#"):
+                    continue
+                for token in line.split():
+                    try:
+                        name, instance_id = parse_input_token(token)
+                    except ValueError as e:
+                        print(f"Ignoring input: {e}")
+                        continue
+                    self._queue.put((name, instance_id))
+        finally:
+            self.finish()
+
+
+def run_input_loop(
+    source: InputSource,
+    engine: "MacroEngine",
+    button_to_action: Mapping[int, str],
+    recorder: Optional[EventRecorder] = None,
+    stats_requested: Optional[threading.Event] = None,
+) -> int:
+    """
+    Feed events from a source to the engine until the source runs out.
 
-        # Too fast? Ignore (probably button bounce)
-        if elapsed < self._macro_settings.macro_min_gap_s:
-            return
+    Housekeeping runs after every batch (including empty ones, when the
+    source was idle). If `stats_requested` gets set, the latency stats
+    are printed at the next batch.
 
-        # We have a valid two-input combo!
-        seq = (self._last_action, action)
-        self._last_action = None
-        self._last_action_time = 0.0
+    Returns:
+        Number of events dispatched
+    """
+    count = 0
+    while True:
+        events = source.poll()
+        if events is None:
+            return count
+        received_at = time.perf_counter()
+        if stats_requested is not None and stats_requested.is_set():
+            stats_requested.clear()
+            print(STATS.report() if STATS is not None else "Latency stats are off (run with --stats)")
+            if engine.lookahead is not None:
+                print(f"Lookahead: {engine.lookahead.summary()}")
+        for event in events:
+            if recorder is not None:
+                recorder.write(event)
+            dispatch_controller_event(event, engine, button_to_action, received_at)
+        count += len(events)
+        engine.housekeeping()
 
-        # Look up the macro template
-        template = self._macros.get(seq)
-        if not template:
-            return
 
-        self._send_template(template)
+# =============================================================================
+# EVDEV INPUT (Linux)
+# =============================================================================
+# `--input evdev` reads controllers straight from /dev/input/event*, with no
+# SDL joystick layer or SDL event queue in between. Every device is opened
+# non-blocking and watched with select(). A read returns whole
+# `struct input_event` records (24 bytes on 64-bit Linux):
+#
+#   struct timeval time   two longs: seconds, microseconds
+#   __u16 type            EV_KEY (buttons), EV_ABS (axes and the D-pad hat),
+#                         EV_SYN (end of a batch), ...
+#   __u16 code            which button or axis
+#   __s32 value           1/0 for buttons (2 = key repeat), -1/0/1 for the hat
+#
+# The kernel is asked to stamp events with CLOCK_MONOTONIC (EVIOCSCLOCKID),
+# the clock behind time.monotonic(), so event times need no conversion.
+# Button codes are the ones the hid-playstation (DualSense) and hid-sony
+# (DS4) drivers report, mapped onto the SDL button numbers in BUTTONS, so
+# dispatch and the combo table work unchanged. Watch out: evdev's hat Y axis
+# points down (-1 = up), SDL's points up.
+#
+# Reading /dev/input usually needs membership of the "input" group. Any
+# readable file works, including a raw capture
+# (`cat /dev/input/event17 > pad.evdev`). A capture is read to its end,
+# with its times shifted to start now.
+# Controllers have to be connected before the script starts.
+# =============================================================================
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+SYN_DROPPED = 3
+ABS_HAT0X = 0x10
+ABS_HAT0Y = 0x11
+BTN_GAMEPAD = 0x130  # a.k.a. BTN_SOUTH; every gamepad has it
+KEY_MAX = 0x2FF
+
+# struct input_event, in the machine's native layout
+EVDEV_EVENT = struct.Struct("llHHi")
+
+# Kernel button code -> SDL button number (as in BUTTONS)
+EVDEV_BUTTONS: Mapping[int, int] = {
+    0x130: BUTTONS["cross"],     # BTN_SOUTH
+    0x131: BUTTONS["circle"],    # BTN_EAST
+    0x133: BUTTONS["triangle"],  # BTN_NORTH
+    0x134: BUTTONS["square"],    # BTN_WEST
+    0x136: BUTTONS["L1"],        # BTN_TL
+    0x137: BUTTONS["R1"],        # BTN_TR
+    0x13A: BUTTONS["share"],     # BTN_SELECT (Share / Create)
+    0x13B: BUTTONS["options"],   # BTN_START
+    0x13C: BUTTONS["ps"],        # BTN_MODE
+    0x220: BUTTONS["up"],        # BTN_DPAD_UP (pads that report the D-pad as buttons)
+    0x221: BUTTONS["down"],      # BTN_DPAD_DOWN
+    0x222: BUTTONS["left"],      # BTN_DPAD_LEFT
+    0x223: BUTTONS["right"],     # BTN_DPAD_RIGHT
+}
+
+
+def _ioc(direction: int, nr: int, size: int) -> int:
+    """An evdev ioctl request number (the kernel's _IOC() with type 'E')."""
+    return (direction << 30) | (size << 16) | (ord("E") << 8) | nr
+
+
+EVIOCSCLOCKID = _ioc(1, 0xA0, 4)
+
+
+def EVIOCGNAME(size: int) -> int:
+    """ioctl request: read the device name into a `size` byte buffer."""
+    return _ioc(2, 0x06, size)
+
+
+def EVIOCGBIT(event_type: int, size: int) -> int:
+    """ioctl request: read the bitmap of codes the device has for a type."""
+    return _ioc(2, 0x20 + event_type, size)
+
+
+class EvdevParser:
+    """
+    Turns the raw bytes read from one evdev device into ControllerEvents.
+
+    Keeps the device's hat position (evdev reports X and Y separately) and
+    any partial record left over from the previous chunk, so bytes can be
+    fed in arbitrary pieces.
+    """
+
+    def __init__(self, instance_id: int = 0, time_offset: Optional[float] = 0.0) -> None:
+        """
+        Args:
+            instance_id: Pad number the events are tagged with
+            time_offset: Added to kernel timestamps to get time.monotonic()
+                         time (0 when the device uses CLOCK_MONOTONIC).
+                         None shifts the first event to "now" (captures).
+        """
+        self.instance_id = instance_id
+        self.time_offset = time_offset
+        self._pending = b""
+        self._hat_x = 0
+        self._hat_y = 0
+        self._dropping = False
+
+    def feed(self, data: bytes) -> List[ControllerEvent]:
+        """Parse a chunk of bytes; returns the events it completed."""
+        buffer = self._pending + data if self._pending else data
+        usable = len(buffer) - len(buffer) % EVDEV_EVENT.size
+        self._pending = buffer[usable:]
+        events: List[ControllerEvent] = []
+        for seconds, micros, event_type, code, value in EVDEV_EVENT.iter_unpack(memoryview(buffer)[:usable]):
+            if event_type == EV_SYN:
+                if code == SYN_DROPPED:
+                    # The kernel's buffer overflowed: skip to the next report
+                    # and assume the D-pad was let go in the meantime
+                    self._dropping = True
+                elif code == SYN_REPORT and self._dropping:
+                    self._dropping = False
+                    if self._hat_x or self._hat_y:
+                        self._hat_x = self._hat_y = 0
+                        events.append(ControllerEvent(EVENT_HAT, self._time(seconds, micros), self.instance_id))
+                continue
+            if self._dropping:
+                continue
+            if event_type == EV_KEY:
+                button = EVDEV_BUTTONS.get(code)
+                if button is None or value > 1:
+                    continue  # Unmapped button, or key repeat
+                kind = EVENT_BUTTON_DOWN if value else EVENT_BUTTON_UP
+                events.append(ControllerEvent(kind, self._time(seconds, micros), self.instance_id, button))
+            elif event_type == EV_ABS and code in (ABS_HAT0X, ABS_HAT0Y):
+                value = max(-1, min(1, value))
+                if code == ABS_HAT0X:
+                    if value == self._hat_x:
+                        continue
+                    self._hat_x = value
+                else:
+                    if value == self._hat_y:
+                        continue
+                    self._hat_y = value
+                t = self._time(seconds, micros)
+                events.append(ControllerEvent(EVENT_HAT, t, self.instance_id, self._hat_x, -self._hat_y))
+        return events
+
+    def _time(self, seconds: int, micros: int) -> float:
+        t = seconds + micros / 1e6
+        if self.time_offset is None:
+            self.time_offset = time.monotonic() - t
+        return t + self.time_offset
+
+
+def evdev_pad_number(path: str, default: int = 0) -> int:
+    """The N of /dev/input/eventN, used as the pad number."""
+    digits = path[len(path.rstrip("0123456789")):]
+    return int(digits) if digits else default
+
+
+def require_evdev() -> None:
+    """
+    Check that evdev input can work on this platform.
+
+    Raises:
+        OSError: If this isn't Linux (there's no /dev/input, and fcntl and
+                 select on devices don't exist on Windows)
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError(f"evdev input is only available on Linux, not {sys.platform}; use --input pygame")
+
+
+def find_evdev_gamepads() -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Find the gamepads under /dev/input.
+
+    Returns:
+        ([(path, device name)] of readable gamepads, [paths we weren't
+        allowed to open])
+
+    Raises:
+        OSError: If this isn't Linux
+    """
+    require_evdev()
+    import fcntl
+
+    found: List[Tuple[str, str]] = []
+    denied: List[str] = []
+    paths = sorted(glob.glob("/dev/input/event*"), key=lambda p: evdev_pad_number(p, -1))
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        except PermissionError:
+            denied.append(path)
+            continue
+        except OSError:
+            continue
+        try:
+            keys = bytearray(KEY_MAX // 8 + 1)
+            fcntl.ioctl(fd, EVIOCGBIT(EV_KEY, len(keys)), keys)
+            if not keys[BTN_GAMEPAD // 8] >> (BTN_GAMEPAD % 8) & 1:
+                continue
+            name = bytearray(256)
+            fcntl.ioctl(fd, EVIOCGNAME(len(name)), name)
+            found.append((path, name.split(b"\0", 1)[0].decode("utf-8", "replace")))
+        except OSError:
+            continue
+        finally:
+            os.close(fd)
+    return found, denied
+
 
-    def _send_template(self, template: str) -> None:
+class EvdevSource(InputSource):
+    """Controller events read directly from evdev devices (Linux)."""
+
+    name = "evdev"
+
+    def __init__(self, paths: Sequence[str] = ()) -> None:
+        """
+        Args:
+            paths: Devices (or capture files) to read; empty = every
+                   gamepad found under /dev/input
         """
-        Render a template and send it as a chat message.
+        super().__init__(self._now)
+        self.paths = list(paths)
+        self._devices: Dict[int, Tuple[str, EvdevParser]] = {}  # fd -> (path, parser)
+        self._latest = float("-inf")
 
-        Tries multiple times to get a unique message (one we haven't
-        sent recently). If all attempts result in duplicates, sends
-        anyway to avoid infinite loops.
+    def _now(self) -> float:
+        # Captures are read faster than real time; never run behind them
+        return max(time.monotonic(), self._latest)
+
+    def open(self) -> None:
         """
-        now = time.time()
+        Open the devices.
 
-        def pick(key: str) -> str:
-            return self._variation_picker.pick(key)
+        Raises:
+            OSError: If this isn't Linux, or there's nothing to read (with a
+                     hint about the "input" group if devices were there but
+                     unreadable)
+        """
+        require_evdev()
+        import fcntl
 
-        # Try up to 8 times to get a non-duplicate message
-        for _ in range(8):
-            message = render_template(template, pick).strip()
-            if self._ascii_only:
-                message = normalize_ascii(message)
-            if not message:
-                return
-            # Skip if same as last message or seen recently
-            if message == self._last_sent_message:
+        if self.paths:
+            devices = [(path, os.path.basename(path)) for path in self.paths]
+        else:
+            devices, denied = find_evdev_gamepads()
+            if not devices:
+                hint = (
+                    f" ({len(denied)} input devices aren't readable; add yourself to the \"input\" group)"
+                    if denied else ""
+                )
+                raise OSError(f"No controllers found under /dev/input{hint}")
+        print("Detected controllers:")
+        for index, (path, name) in enumerate(devices):
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            if os.path.isfile(path):
+                time_offset: Optional[float] = None  # A capture: start it now
+            else:
+                try:
+                    fcntl.ioctl(fd, EVIOCSCLOCKID, struct.pack("i", time.CLOCK_MONOTONIC))
+                    time_offset = 0.0
+                except OSError:
+                    # Stuck with wall-clock stamps
+                    time_offset = time.monotonic() - time.time()
+            instance_id = evdev_pad_number(path, index)
+            self.add_device(fd, path, EvdevParser(instance_id, time_offset))
+            print(f"  - {path}: {name} (pad {instance_id})")
+        print()
+
+    def add_device(self, fd: int, path: str, parser: EvdevParser) -> None:
+        """Start reading an already open (non-blocking) file descriptor."""
+        self._devices[fd] = (path, parser)
+
+    def poll(self) -> Optional[List[ControllerEvent]]:
+        if not self._devices:
+            return None
+        ready, _, _ = select.select(list(self._devices), [], [], LOOP_WAIT_TIMEOUT_MS / 1000.0)
+        events: List[ControllerEvent] = []
+        for fd in ready:
+            path, parser = self._devices[fd]
+            try:
+                data = os.read(fd, EVDEV_EVENT.size * 64)
+            except BlockingIOError:
                 continue
-            if self._recent.seen_recently(message, now):
+            except OSError:
+                # Unplugged (ENODEV)
+                print(f"Controller removed: {path}")
+                self._drop(fd)
+                events.append(ControllerEvent(EVENT_DEVICE_REMOVED, time.monotonic(), parser.instance_id))
                 continue
-            # Found a good one!
-            send_chat(message, self._chat_settings)
-            print(f"Sent quick chat: {message}")
-            self._last_sent_message = message
-            self._recent.add(message, now)
-            return
+            if not data:
+                self._drop(fd)  # End of a capture file (or pipe)
+                continue
+            events.extend(parser.feed(data))
+        if events:
+            self._latest = max(self._latest, max(event.t for event in events))
+        elif not self._devices:
+            return None
+        return events
 
-        # Fallback: just send whatever we have
-        message = render_template(template, pick).strip()
-        if self._ascii_only:
-            message = normalize_ascii(message)
-        if message:
-            send_chat(message, self._chat_settings)
-            print(f"Sent quick chat: {message}")
-            self._last_sent_message = message
-            self._recent.add(message, now)
+    def _drop(self, fd: int) -> None:
+        del self._devices[fd]
+        os.close(fd)
+
+    def close(self) -> None:
+        for fd in list(self._devices):
+            self._drop(fd)
 
 
 # =============================================================================
@@ -1116,6 +5014,29 @@ class MacroEngine:
 # =============================================================================
 
 
+def init_pygame_for_input() -> None:
+    """
+    Start only the parts of SDL this script needs.
+
+    pygame.init() also starts audio, fonts and friends, which we never use.
+    We only need the joystick subsystem and pygame's event queue (which
+    pygame ties to the video subsystem - no window is opened). Every event
+    type except joystick events and our own USEREVENTs is blocked, so the
+    queue only ever wakes us for input.
+    """
+    pygame.display.init()
+    pygame.joystick.init()
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([
+        pygame.JOYBUTTONDOWN,
+        pygame.JOYBUTTONUP,
+        pygame.JOYHATMOTION,
+        pygame.JOYDEVICEADDED,
+        pygame.JOYDEVICEREMOVED,
+        pygame.USEREVENT,
+    ])
+
+
 def list_controllers() -> List[pygame.joystick.Joystick]:
     """
     Detect and initialize all connected game controllers.
@@ -1137,6 +5058,14 @@ def list_controllers() -> List[pygame.joystick.Joystick]:
 # =============================================================================
 
 
+def _pad_option(value: str) -> Tuple[int, str]:
+    """argparse type for ID=VALUE per-pad options."""
+    pad, sep, setting = value.partition("=")
+    if not sep or not pad.strip().isdigit() or not setting.strip():
+        raise argparse.ArgumentTypeError(f"expected PAD=VALUE with a numeric pad id, got {value!r}")
+    return int(pad), setting.strip()
+
+
 def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -1148,6 +5077,8 @@ Examples:
   python DS5QuickchatsRL.py --chat-mode team   # Use team chat instead
   python DS5QuickchatsRL.py --dry-run          # Print messages without sending
   python DS5QuickchatsRL.py --list-devices     # Show detected controllers
+  python DS5QuickchatsRL.py compile            # Check all messages, write a bundle
+  python DS5QuickchatsRL.py --input stdin      # Type inputs ("up up") instead of a controller
 
 D-pad combos:
   UP+UP       I got it!          LEFT+UP      Nice shot!
@@ -1163,6 +5094,22 @@ D-pad combos:
         choices=sorted(DEFAULT_CHAT_KEYS.keys()),
         help="Which chat to use: lobby (all), team, or party"
     )
+    parser.add_argument(
+        "--pad-chat-mode",
+        action="append",
+        type=_pad_option,
+        metavar="PAD=MODE",
+        help="Send one controller's quickchats to another chat, e.g. 1=team "
+             "(PAD is the pad number shown at startup); repeatable"
+    )
+    parser.add_argument(
+        "--pad-macros",
+        action="append",
+        type=_pad_option,
+        metavar="PAD=FILE",
+        help="Give one controller its own combos from a message pack's macros table, "
+             "layered over the shared ones; repeatable"
+    )
     parser.add_argument(
         "--macro-window",
         type=float,
@@ -1175,6 +5122,61 @@ D-pad combos:
         default=0.2,
         help="Delay between repeated sends in seconds (default: 0.2)"
     )
+    parser.add_argument(
+        "--backend",
+        default="pyautogui",
+        choices=CHAT_BACKENDS,
+        help="How to deliver keystrokes: pyautogui (type each key), clipboard (paste whole "
+             "message), dry-run (print), memory (discard; for testing) (default: pyautogui)"
+    )
+    parser.add_argument(
+        "--send-queue",
+        type=int,
+        default=4,
+        help="Max messages waiting to be typed; extras are dropped (default: 4)"
+    )
+    parser.add_argument(
+        "--no-lookahead",
+        action="store_true",
+        help="Don't pre-render the next message of each combo between inputs"
+    )
+    parser.add_argument(
+        "--chat-burst",
+        type=int,
+        default=3,
+        help="Messages that may be sent back to back before rate limiting starts (default: 3)"
+    )
+    parser.add_argument(
+        "--chat-rate",
+        type=float,
+        default=0.5,
+        help="Sustained messages per second after a burst; 0 disables the limiter (default: 0.5)"
+    )
+    parser.add_argument(
+        "--message-ttl",
+        type=float,
+        default=3.0,
+        help="Drop quick chats that would go out more than this many seconds late; 0 never drops (default: 3.0)"
+    )
+    corpus_source = parser.add_mutually_exclusive_group()
+    corpus_source.add_argument(
+        "--pack",
+        action="append",
+        metavar="FILE",
+        help="Load extra messages/macros from a JSON or TOML message pack; repeat to layer "
+             "several (later packs win). Packs are reloaded when they change"
+    )
+    corpus_source.add_argument(
+        "--bundle",
+        metavar="FILE",
+        help="Load the corpus (and its packs) from a bundle written by the compile subcommand"
+    )
+    parser.add_argument(
+        "--pack-poll",
+        type=float,
+        default=1.0,
+        help="Seconds between checks for edited message packs; 0 disables reloading (default: 1.0)"
+    )
     parser.add_argument(
         "--cooldown",
         type=float,
@@ -1196,14 +5198,111 @@ D-pad combos:
         action="store_true",
         help="Print messages instead of typing them (for testing)"
     )
+    parser.add_argument(
+        "--loop-mode",
+        default="wait",
+        choices=LOOP_MODES,
+        help="How to read controller events: wait (block until input) or poll (5 ms sleep loop)"
+    )
+    parser.add_argument(
+        "--input",
+        default="pygame",
+        choices=INPUT_SOURCES,
+        help="Where inputs come from: pygame (controllers), stdin (text like "
+             "\"up up\" or \"2:left L1\"; no pygame or controller needed) or evdev "
+             "(Linux: read /dev/input directly, skipping SDL) (default: pygame)"
+    )
+    parser.add_argument(
+        "--evdev-device",
+        action="append",
+        metavar="PATH",
+        help="With --input evdev, read this device (or raw capture file) instead of "
+             "every gamepad found; repeatable"
+    )
+    parser.add_argument(
+        "--input-gap",
+        type=float,
+        default=INPUT_GAP_S * 1000.0,
+        metavar="MS",
+        help=f"With --input stdin, minimum time between inputs in ms; piped input runs "
+             f"ahead of real time at this pace (default: {INPUT_GAP_S * 1000.0:g})"
+    )
+    parser.add_argument(
+        "--loop-stats",
+        action="store_true",
+        help="Measure idle CPU and event dispatch latency; printed on exit"
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Time every stage from button press to chat; histograms printed on exit "
+             "(or on demand with Ctrl+Break on Windows / SIGUSR1 elsewhere)"
+    )
+    parser.add_argument(
+        "--record",
+        default="",
+        metavar="FILE",
+        help="Record every controller event to FILE (compact binary format)"
+    )
+    parser.add_argument(
+        "--replay",
+        default="",
+        metavar="FILE",
+        help="Replay a --record file through the macro engine instead of reading a controller"
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Replay speed multiplier; 0 = as fast as possible (default: 1.0)"
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="Print how long each startup phase took"
+    )
     parser.add_argument(
         "--list-devices",
         action="store_true",
-        help="List detected controllers and exit"
+        help="List detected controllers (pygame or evdev) and exit"
     )
     return parser.parse_args(argv)
 
 
+# =============================================================================
+# STARTUP TIMING
+# =============================================================================
+# --startup-report prints how long each startup phase took, so a slow import
+# or a regression in corpus/engine setup is easy to spot. For a per-module
+# import breakdown, combine it with Python's own: python -X importtime ...
+# =============================================================================
+
+
+class StartupTimer:
+    """Records the duration of named startup phases."""
+
+    def __init__(self) -> None:
+        self.phases: List[Tuple[str, float]] = [("import pygame", PYGAME_IMPORT_S)]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the body of a with-block as one phase."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - t0))
+
+    def report(self) -> str:
+        """importtime-style table: self time and cumulative time per phase."""
+        lines = ["Startup time:", f"  {'self ms':>9} | {'cumulative':>10} | phase"]
+        total = 0.0
+        for name, seconds in self.phases:
+            total += seconds
+            lines.append(f"  {seconds * 1000.0:>9.1f} | {total * 1000.0:>10.1f} | {name}")
+        return "\n".join(lines)
+
+
 # =============================================================================
 # MAIN ENTRY POINT
 # =============================================================================
@@ -1216,7 +5315,17 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     Returns:
         Exit code (0 for success, non-zero for errors)
     """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv[:1] == ["compile"]:
+        return compile_main(argv[1:])
     args = parse_args(argv)
+    replaying = bool(args.replay)
+    # Live controllers need pygame; --replay and --input stdin don't
+    use_pygame = not replaying and args.input == "pygame"
+
+    if pygame is None and use_pygame:
+        print("pygame is not installed. Run: pip install -r requirements.txt")
+        return 2
 
     # Warn if running under WSL (won't work for Windows games)
     if sys.platform.startswith("linux") and is_wsl():
@@ -1225,96 +5334,239 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
             "Run this with Windows Python (PowerShell/CMD) instead if Rocket League is on Windows."
         )
 
-    # Initialize pygame for controller input
-    pygame.init()
-    pygame.joystick.init()
-
-    # Handle --list-devices flag
-    if args.list_devices:
-        controllers = list_controllers()
+    startup = StartupTimer()
+    if use_pygame:
+        # Initialize only the SDL pieces needed for controller input
+        with startup.phase("SDL init (events + joystick)"):
+            init_pygame_for_input()
+
+        # Handle --list-devices flag
+        if args.list_devices:
+            controllers = list_controllers()
+            if not controllers:
+                print("No controllers detected.")
+            for js in controllers:
+                print(
+                    f"- #{js.get_id()}: {js.get_name()} (pad {js.get_instance_id()}, "
+                    f"buttons={js.get_numbuttons()}, hats={js.get_numhats()}, axes={js.get_numaxes()})"
+                )
+            return 0
+
+        # Detect controllers
+        with startup.phase("controller scan"):
+            controllers = list_controllers()
         if not controllers:
-            print("No controllers detected.")
+            print("No controllers detected. Connect your controller, then rerun.")
+            return 2
+
+        print("Detected controllers:")
         for js in controllers:
-            print(
-                f"- #{js.get_id()}: {js.get_name()} "
-                f"(buttons={js.get_numbuttons()}, hats={js.get_numhats()}, axes={js.get_numaxes()})"
-            )
+            print(f"  - #{js.get_id()}: {js.get_name()} (pad {js.get_instance_id()})")
+        print()
+    elif args.list_devices:
+        if replaying or args.input != "evdev":
+            print("--list-devices lists live controllers; it can't be combined with --input stdin or --replay")
+            return 2
+        try:
+            found, denied = find_evdev_gamepads()
+        except OSError as e:
+            print(f"Failed to list evdev devices: {e}")
+            return 2
+        if not found:
+            print("No controllers detected.")
+        for path, name in found:
+            print(f"- {path}: {name} (pad {evdev_pad_number(path)})")
+        if denied:
+            print(f"Not readable (add yourself to the \"input\" group): {', '.join(denied)}")
         return 0
 
-    # Detect controllers
-    controllers = list_controllers()
-    if not controllers:
-        print("No controllers detected. Connect your controller, then rerun.")
-        return 2
-
-    print("Detected controllers:")
-    for js in controllers:
-        print(f"  - #{js.get_id()}: {js.get_name()}")
-    print()
-    print("Quickchat macros are ACTIVE!")
-    print("  - Use D-pad combos to send messages")
-    print("  - Press PS button to toggle macros on/off")
-    print("  - Press Ctrl+C to quit")
-    print()
-
     # Set up the macro engine
-    variation_picker = VariationPicker(variations)
+    macro_settings = MacroSettings(macro_window_s=float(args.macro_window))
+    pack_paths = list(args.pack or [])
+    bundle: Optional[Bundle] = None
+    if args.bundle:
+        with startup.phase("load bundle"):
+            try:
+                bundle = load_bundle(args.bundle)
+            except StaleBundle as e:
+                print(f"Warning: {e}; building the corpus from source. Rerun: python {sys.argv[0]} compile")
+                pack_paths = list(e.pack_paths)
+            except (OSError, ValueError) as e:
+                print(f"Failed to load bundle: {e}")
+                return 2
+            else:
+                pack_paths = list(bundle.pack_paths)
+    pack_watcher = PackWatcher(
+        pack_paths,
+        base_variations=variations,
+        base_macros=macros,
+        window_s=macro_settings.macro_window_s,
+        interval_s=float(args.pack_poll),
+    )
+    with startup.phase("message corpus"):
+        if bundle is not None:
+            corpus = bundle.corpus
+            pack_watcher.adopt(corpus)
+            variation_picker = VariationPicker(corpus.variations, alias_index=bundle.alias_index)
+        else:
+            try:
+                corpus = pack_watcher.load()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Failed to load message packs: {e}")
+                return 2
+            variation_picker = VariationPicker(corpus.variations)
+    hot_reload = bool(pack_paths) and args.pack_poll > 0
+
+    # Per-controller chat modes and macro maps
+    pad_chat_modes: Dict[int, str] = {}
+    for pad, mode in args.pad_chat_mode or []:
+        if mode not in DEFAULT_CHAT_KEYS:
+            print(f"Unknown chat mode {mode!r} for pad {pad}. Known: {sorted(DEFAULT_CHAT_KEYS)}")
+            return 2
+        pad_chat_modes[pad] = mode
+    pad_macros: Dict[int, Dict[Tuple[str, ...], str]] = {}
+    for pad, path in args.pad_macros or []:
+        try:
+            pack_macros = load_message_pack(path).macros
+        except (OSError, ValueError) as e:
+            print(f"Failed to load macros for pad {pad}: {e}")
+            return 2
+        pad_macros.setdefault(pad, {}).update(pack_macros)
+    pad_profiles = {
+        pad: PadProfile(chat_mode=pad_chat_modes.get(pad), macros=pad_macros.get(pad))
+        for pad in sorted(set(pad_chat_modes) | set(pad_macros))
+    }
     chat_settings = ChatSettings(
         chat_mode=args.chat_mode,
         chat_spam_interval_s=float(args.spam_interval),
+        backend=str(args.backend),
         dry_run=bool(args.dry_run),
+        chat_burst=int(args.chat_burst),
+        chat_rate_per_s=float(args.chat_rate),
+        message_ttl_s=float(args.message_ttl),
     )
-    macro_settings = MacroSettings(macro_window_s=float(args.macro_window))
-    engine = MacroEngine(
-        variation_picker=variation_picker,
-        chat_settings=chat_settings,
-        macro_settings=macro_settings,
-        message_cooldown_s=float(args.cooldown),
-        ascii_only=bool(args.ascii),
-        persist_path=(str(args.persist).strip() or None),
-    )
+    sender = ChatSender(chat_settings, max_queue=int(args.send_queue))
+    # Load the keystroke backend now, so the first quickchat isn't late
+    with startup.phase(f"sender backend warm-up ({sender.backend.name})"):
+        try:
+            sender.backend.warm()
+        except ImportError as e:
+            print(f"Chat backend {sender.backend.name!r} is unavailable ({e}). Run: pip install -r requirements.txt")
+            return 2
+    sender.start()
+
+    loop_stats: Optional[LoopStats] = None
+    source: InputSource
+    if replaying:
+        source = ReplaySource(args.replay, float(args.replay_speed))
+    elif args.input == "stdin":
+        source = StdinSource(sys.stdin, gap_s=float(args.input_gap) / 1000.0)
+    elif args.input == "evdev":
+        source = EvdevSource(args.evdev_device or [])
+    else:
+        if args.loop_stats:
+            loop_stats = LoopStats(args.loop_mode)
+        source = PygameSource(args.loop_mode, loop_stats)
+    try:
+        with startup.phase(f"open input ({source.name})"):
+            source.open()
+    except (OSError, ValueError) as e:
+        print(f"Failed to open {source.name} input: {e}")
+        sender.stop()
+        return 2
+    recorder: Optional[EventRecorder] = None
+    if args.record:
+        try:
+            recorder = EventRecorder(args.record)
+        except OSError as e:
+            print(f"Failed to open recording file: {e}")
+            sender.stop()
+            source.close()
+            return 2
+    try:
+        with startup.phase("macro engine (combos, templates, saved state)"):
+            engine = MacroEngine(
+                variation_picker=variation_picker,
+                chat_settings=chat_settings,
+                macro_settings=macro_settings,
+                message_cooldown_s=float(args.cooldown),
+                ascii_only=bool(args.ascii),
+                persist_path=(str(args.persist).strip() or None),
+                sender=sender,
+                clock=source.clock,
+                macro_map=corpus.macros,
+                priorities=corpus.priorities,
+                templates=corpus.templates,
+                pack_watcher=pack_watcher if hot_reload else None,
+                pad_profiles=pad_profiles,
+                lookahead=not args.no_lookahead,
+            )
+    except (KeyError, ValueError) as e:
+        print(f"Invalid macro configuration: {e}")
+        sender.stop()
+        source.close()
+        if recorder is not None:
+            recorder.close()
+        return 2
+    if hot_reload:
+        pack_watcher.start()
+
+    if args.startup_report:
+        print(startup.report())
+        print()
+
+    if replaying:
+        speed = "max speed" if args.replay_speed <= 0 else f"{args.replay_speed:g}x speed"
+        print(f"Replaying {args.replay} at {speed} (Ctrl+C to stop)")
+        print()
+    elif args.input == "stdin":
+        print("Reading inputs from stdin, e.g. \"up up\" or \"2:left L1\" (end of input or Ctrl+C to stop)")
+        print()
+    else:
+        # Live controllers (pygame or evdev)
+        print("Quickchat macros are ACTIVE!")
+        print("  - Use D-pad combos to send messages")
+        print("  - Press PS button to toggle macros on/off")
+        print("  - Press Ctrl+C to quit")
+        print()
 
     # Reverse lookup: button number -> action name
     button_to_action = {v: k for k, v in BUTTONS.items()}
 
-    # Main event loop
-    try:
-        while True:
-            for event in pygame.event.get():
-                # Handle button presses (for controllers that expose D-pad as buttons)
-                if event.type == pygame.JOYBUTTONDOWN:
-                    action = button_to_action.get(int(event.button))
-                    if action:
-                        engine.handle_action(action)
-
-                # Handle hat motion (for controllers that expose D-pad as a hat)
-                elif event.type == pygame.JOYHATMOTION:
-                    action = hat_to_dpad_action(tuple(event.value))
-                    if action:
-                        engine.handle_action(action)
-
-                # Handle controller connect/disconnect
-                elif event.type == pygame.JOYDEVICEADDED:
-                    try:
-                        js = pygame.joystick.Joystick(event.device_index)
-                        js.init()
-                        print(f"Controller added: #{js.get_id()}: {js.get_name()}")
-                    except Exception:
-                        pass
+    stats = enable_stats() if args.stats else None
+    stats_requested = install_stats_signal()
 
-                elif event.type == pygame.JOYDEVICEREMOVED:
-                    print(f"Controller removed: instance_id={event.instance_id}")
+    if loop_stats is not None:
+        loop_stats.start()
 
-            # Small sleep to avoid busy-waiting
-            time.sleep(0.005)
+    try:
+        count = run_input_loop(source, engine, button_to_action, recorder, stats_requested)
+        # The source ran out (end of a replay or of piped input): let
+        # whatever is still queued be sent before exiting
+        sender.stop(timeout_s=None, drain=True)
+        print(f"Replayed {count} events." if replaying else f"End of input after {count} events.")
+        return 0
 
     except KeyboardInterrupt:
         print("\nExiting...")
         return 0
     finally:
         # Save state for next session and clean up
+        pack_watcher.stop()
+        sender.stop()
+        print(f"Sender: {sender.stats.summary()}")
+        if engine.lookahead is not None:
+            print(f"Lookahead: {engine.lookahead.summary()}")
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.count} events to {args.record}")
+        if loop_stats is not None:
+            loop_stats.stop()
+            print(loop_stats.summary())
+        if stats is not None:
+            print(stats.report())
         engine.save_persisted_state()
-        pygame.quit()
+        source.close()
 
 
 # =============================================================================
@@ -0,0 +1,806 @@
+"""
+Benchmarks for DS5 Quickchats
+=============================
+
+Micro-benchmarks for the hot paths between a D-pad combo and a chat message.
+Nothing here touches a controller or the keyboard.
+
+The suite runs headless: it needs neither pygame devices nor pyautogui, so it
+can run in CI on a plain Linux box. Results are printed as JSON so they can be
+diffed or compared against a saved baseline.
+
+USAGE:
+    python bench_quickchats.py render [--number N]
+    python bench_quickchats.py soak [--events 100000] [--size 1000]
+    python bench_quickchats.py input-latency [--events 2000] [--interval-ms 2]
+    python bench_quickchats.py delivery [--backends memory,dry-run,pyautogui,clipboard]
+                                        [--lengths 10,40,100,200] [--repeat N]
+    python bench_quickchats.py suite [--sizes 250,1000,10000,100000] [--combos N]
+                                     [--stream FILE] [--output FILE]
+                                     [--baseline FILE] [--tolerance 0.25]
+
+STREAM FILES:
+    Either a recording made with `DS5QuickchatsRL.py --record FILE`, or plain
+    text with one input per line: "<seconds> <action>", e.g.
+
+        0.00 up
+        0.20 up
+        1.50 L1
+
+    Blank lines and lines starting with # are ignored.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import DS5QuickchatsRL as qc
+
+
+# =============================================================================
+# REFERENCE IMPLEMENTATIONS
+# =============================================================================
+# The original character-by-character template parser, kept here so the
+# compiled templates can be compared against it.
+# =============================================================================
+
+
+def legacy_render_template(template: str, pick_variation: Callable[[str], str]) -> str:
+    """Character-by-character template renderer (pre-compiled-template version)."""
+    out: List[str] = []
+    i = 0
+    while i < len(template):
+        if template[i] != "{":
+            out.append(template[i])
+            i += 1
+            continue
+
+        end = template.find("}", i + 1)
+        if end == -1:
+            out.append(template[i:])
+            break
+
+        token = template[i + 1 : end].strip()
+        if ":" in token:
+            key, modifier = token.split(":", 1)
+        else:
+            key, modifier = token, None
+
+        replacement = pick_variation(key.strip())
+        out.append(qc.apply_text_modifier(replacement, modifier))
+        i = end + 1
+
+    return "".join(out)
+
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+
+RENDER_TEMPLATES: Sequence[str] = (
+    "{cat fact}",
+    "{compliment:upper}",
+    "Nice one! {compliment:lower} Seriously, {Thanks}",
+    "GG! {Greeting} {Nice One:capitalize} {cat fact} -- {Challenge:title}!",
+)
+
+
+def bench_render(number: int) -> None:
+    """Compare the legacy parser with cached compiled templates."""
+    picker = qc.VariationPicker(qc.variations)
+    pick = picker.pick
+    cache = qc.TemplateCache(resolve_key=picker.resolve_key)
+
+    print(f"render_template: {number} renders per template (lower is better)")
+    print(f"  {'template':<42} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}")
+    for template in RENDER_TEMPLATES:
+        legacy = min(timeit.repeat(lambda: legacy_render_template(template, pick), number=number, repeat=5))
+        compiled = min(timeit.repeat(lambda: cache.get(template).render(pick), number=number, repeat=5))
+        legacy_us = legacy / number * 1e6
+        compiled_us = compiled / number * 1e6
+        label = template if len(template) <= 40 else template[:37] + "..."
+        print(f"  {label:<42} {legacy_us:>10.2f} {compiled_us:>12.2f} {legacy_us / compiled_us:>7.1f}x")
+
+
+# =============================================================================
+# PIPELINE SUITE
+# =============================================================================
+# Feeds input streams straight into MacroEngine.handle_action with a fake
+# clock and an in-memory sink in place of the chat sender, so the numbers are
+# deterministic (for a given seed) and measure only the engine itself.
+# housekeeping() runs after every input like in the main loop; its time
+# (e.g. lookahead pre-rendering) counts towards combos_per_s but not towards
+# the per-combo latencies.
+# =============================================================================
+
+DEFAULT_SIZES: Tuple[int, ...] = (250, 1000, 10000, 100000)
+
+_FILLER_WORDS: Sequence[str] = (
+    "boost", "aerial", "whiff", "demo", "rotate", "kickoff", "flip", "reset",
+    "ceiling", "pinch", "goal", "save", "ball", "chase", "wall", "corner",
+)
+
+Stream = List[Tuple[float, str]]
+
+
+class ListSink:
+    """Stands in for ChatSender: collects messages instead of typing them."""
+
+    def __init__(self) -> None:
+        self.messages: List[str] = []
+        self.on_done: Optional[Callable[[qc.PendingChat, bool], None]] = None
+
+    def submit(
+        self,
+        message: str,
+        chat_mode: Optional[str] = None,
+        priority: int = qc.PRIORITY_NORMAL,
+        key: Optional[str] = None,
+        tag: object = None,
+    ) -> bool:
+        self.messages.append(message)
+        if self.on_done is not None:
+            # "Delivered" at once, like the real sender a moment later
+            self.on_done(qc.PendingChat(message, 0.0, chat_mode, priority, key, tag), True)
+        return True
+
+    def cancel(self, clear_queue: bool = True) -> None:
+        pass
+
+
+class FakeClock:
+    """Clock the suite advances by hand, one stream timestamp at a time."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def build_corpus(size: int, seed: int) -> Dict[str, List[str]]:
+    """
+    Build a corpus of about `size` messages using the real category names.
+
+    Sizes at or below the built-in corpus just use the built-in messages.
+    Bigger corpora are filled with synthetic messages of realistic length.
+    """
+    builtin = sum(len(v) for v in qc.variations.values())
+    if size <= builtin:
+        return {k: list(v) for k, v in qc.variations.items()}
+    rng = random.Random(seed)
+    categories = list(qc.variations)
+    per_category = max(1, size // len(categories))
+    corpus: Dict[str, List[str]] = {}
+    for key in categories:
+        items = []
+        for i in range(per_category):
+            words = " ".join(rng.choice(_FILLER_WORDS) for _ in range(rng.randint(3, 14)))
+            items.append(f"{key} #{i}: {words}!")
+        corpus[key] = items
+    return corpus
+
+
+def synthetic_stream(macros: Mapping[Tuple[str, ...], str], combos: int, seed: int) -> Stream:
+    """
+    A stream that enters `combos` random macro sequences.
+
+    Inputs within a combo are 150 ms apart; combos are 1.5 s apart so each
+    one starts fresh. Every few combos a stray face-button press is mixed
+    in, like a jump in the middle of a callout.
+    """
+    rng = random.Random(seed)
+    sequences = sorted(macros)
+    stream: Stream = []
+    t = 0.0
+    for n in range(combos):
+        sequence = rng.choice(sequences)
+        for step, action in enumerate(sequence):
+            stream.append((t, action))
+            if step == 0 and n % 4 == 3:
+                stream.append((t + 0.07, "cross"))
+            t += 0.15
+        t += 1.5
+    return stream
+
+
+def load_stream(path: str) -> Stream:
+    """
+    Load a stream file: either a --record file from DS5QuickchatsRL.py, or
+    the "<seconds> <action>" text format (see module docstring).
+    """
+    with open(path, "rb") as f:
+        is_recording = f.read(len(qc.RECORDING_MAGIC)) == qc.RECORDING_MAGIC
+    if is_recording:
+        return recording_to_stream(path)
+
+    stream: Stream = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                t, action = line.split(None, 1)
+                stream.append((float(t), action.strip()))
+            except ValueError:
+                raise ValueError(f"{path}:{lineno}: expected '<seconds> <action>', got {line!r}") from None
+    return stream
+
+
+def recording_to_stream(path: str) -> Stream:
+    """Turn a binary controller recording into (seconds, action) pairs."""
+    button_to_action = {v: k for k, v in qc.BUTTONS.items()}
+    stream: Stream = []
+    for event in qc.read_recording(path):
+        if event.kind == qc.EVENT_BUTTON_DOWN:
+            action = button_to_action.get(event.a)
+        elif event.kind == qc.EVENT_HAT:
+            action = qc.hat_to_dpad_action((event.a, event.b))
+        else:
+            action = None
+        if action:
+            stream.append((event.t, action))
+    return stream
+
+
+def _percentile(ordered: Sequence[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _make_engine(corpus: Mapping[str, Sequence[str]], clock: FakeClock) -> Tuple[qc.MacroEngine, ListSink]:
+    sink = ListSink()
+    engine = qc.MacroEngine(
+        variation_picker=qc.VariationPicker(corpus),
+        chat_settings=qc.ChatSettings(dry_run=True),
+        macro_settings=qc.MacroSettings(),
+        message_cooldown_s=600.0,
+        ascii_only=False,
+        persist_path=None,
+        sender=sink,  # type: ignore[arg-type]
+        clock=clock,
+    )
+    return engine, sink
+
+
+def run_pipeline(corpus: Mapping[str, Sequence[str]], stream: Stream, seed: int) -> Dict[str, float]:
+    """Replay a stream through a fresh engine and time every input."""
+    random.seed(seed)
+    clock = FakeClock()
+    engine, sink = _make_engine(corpus, clock)
+
+    combo_latencies: List[float] = []
+    start = time.perf_counter()
+    for t, action in stream:
+        clock.now = t
+        sent_before = len(sink.messages)
+        t0 = time.perf_counter()
+        engine.handle_action(action)
+        elapsed = time.perf_counter() - t0
+        if len(sink.messages) != sent_before:
+            combo_latencies.append(elapsed)
+        # Between inputs, like the main loop (untimed: it's off the input path)
+        engine.housekeeping()
+    wall = time.perf_counter() - start
+    lookahead = engine.lookahead
+
+    # Second pass with tracemalloc on (it slows everything down, so it's
+    # kept out of the timing pass above).
+    random.seed(seed)
+    clock = FakeClock()
+    engine, sink = _make_engine(corpus, clock)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for t, action in stream:
+        clock.now = t
+        engine.handle_action(action)
+        engine.housekeeping()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    net_blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+    ordered = sorted(combo_latencies)
+    combos = len(ordered)
+    return {
+        "inputs": len(stream),
+        "combos": combos,
+        "combos_per_s": combos / wall if wall > 0 else 0.0,
+        "combo_p50_us": _percentile(ordered, 0.50) * 1e6,
+        "combo_p99_us": _percentile(ordered, 0.99) * 1e6,
+        "combo_max_us": (ordered[-1] * 1e6) if ordered else 0.0,
+        "alloc_net_blocks_per_combo": (net_blocks / combos) if combos else 0.0,
+        "alloc_peak_bytes": float(peak),
+        "lookahead_hit_rate": (lookahead.hits / max(1, lookahead.hits + lookahead.misses)) if lookahead else 0.0,
+    }
+
+
+def run_components(corpus: Mapping[str, Sequence[str]], seed: int, number: int = 2000) -> Dict[str, float]:
+    """Per-operation timings of the pieces the pipeline is built from."""
+    random.seed(seed)
+    picker = qc.VariationPicker(corpus)
+    key = "Need Boost"
+    cache = qc.RecentMessageCache(cooldown_s=600.0)
+    messages = [m for items in corpus.values() for m in items]
+    for i, message in enumerate(messages[: cache.max_entries]):
+        cache.add(message, i * 0.01)
+    probe = messages[len(messages) // 2]
+    templates = qc.TemplateCache(resolve_key=picker.resolve_key)
+    template = "GG! {Greeting} {Nice One:capitalize}"
+
+    def per_op_ns(fn: Callable[[], object]) -> float:
+        return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e9
+
+    return {
+        "picker_pick_ns": per_op_ns(lambda: picker.pick(key)),
+        "picker_resolve_key_ns": per_op_ns(lambda: picker.resolve_key("need_boost")),
+        "recent_seen_recently_ns": per_op_ns(lambda: cache.seen_recently(probe, 100.0)),
+        "render_template_ns": per_op_ns(lambda: templates.get(template).render(picker.pick)),
+    }
+
+
+def run_suite(sizes: Sequence[int], combos: int, seed: int, stream_path: Optional[str]) -> Dict[str, object]:
+    """Run the pipeline and component benchmarks for every corpus size."""
+    results = []
+    for size in sizes:
+        corpus = build_corpus(size, seed)
+        clock = FakeClock()
+        engine, _ = _make_engine(corpus, clock)
+        if stream_path:
+            stream = load_stream(stream_path)
+            stream_name = stream_path
+        else:
+            stream = synthetic_stream(engine.macros, combos, seed)
+            stream_name = "synthetic"
+        entry: Dict[str, object] = {
+            "corpus_size": sum(len(v) for v in corpus.values()),
+            "stream": stream_name,
+        }
+        # The engine prints notes (e.g. "all messages on cooldown"); keep
+        # them out of the JSON report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            entry.update(run_pipeline(corpus, stream, seed))
+            entry.update(run_components(corpus, seed))
+        results.append(entry)
+    return {
+        "benchmark": "pipeline",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+# Metrics where a bigger number is a regression (everything else reported by
+# the suite is informational, except combos_per_s where smaller is worse).
+_LOWER_IS_BETTER = (
+    "combo_p50_us", "combo_p99_us",
+    "picker_pick_ns", "picker_resolve_key_ns", "recent_seen_recently_ns", "render_template_ns",
+)
+
+
+def compare_to_baseline(report: Mapping[str, object], baseline: Mapping[str, object], tolerance: float) -> List[str]:
+    """
+    List metrics that got worse than the baseline by more than `tolerance`.
+
+    Results are matched by corpus size; sizes missing from either side are
+    skipped.
+    """
+    def by_size(doc: Mapping[str, object]) -> Dict[int, Mapping[str, float]]:
+        results = doc.get("results")
+        if not isinstance(results, list):
+            return {}
+        return {int(r["corpus_size"]): r for r in results if isinstance(r, dict)}
+
+    current, previous = by_size(report), by_size(baseline)
+    regressions = []
+    for size in sorted(set(current) & set(previous)):
+        now, before = current[size], previous[size]
+        for metric in _LOWER_IS_BETTER:
+            if metric in now and metric in before and before[metric] > 0:
+                if now[metric] > before[metric] * (1.0 + tolerance):
+                    regressions.append(f"size={size} {metric}: {before[metric]:.1f} -> {now[metric]:.1f}")
+        metric = "combos_per_s"
+        if metric in now and metric in before and before[metric] > 0:
+            if now[metric] < before[metric] * (1.0 - tolerance):
+                regressions.append(f"size={size} {metric}: {before[metric]:.1f} -> {now[metric]:.1f}")
+    return regressions
+
+
+# =============================================================================
+# SOAK TEST
+# =============================================================================
+# The whole live path minus the controller: a producer thread pushes inputs
+# into a QueueSource, and run_input_loop() feeds them to the engine and a real
+# ChatSender (memory backend, rate limits off) exactly as main() does. Inputs
+# are paced 150 ms apart on the engine's clock, so an hour of play goes
+# through in seconds.
+# =============================================================================
+
+
+def run_soak(events: int, size: int, seed: int) -> Dict[str, object]:
+    """Push `events` inputs through the input loop and report throughput."""
+    random.seed(seed)
+    corpus = build_corpus(size, seed)
+    source = qc.QueueSource(gap_s=0.15)
+    settings = qc.ChatSettings(
+        backend="memory",
+        chat_spam_interval_s=0.0,
+        chat_burst=1000,
+        chat_rate_per_s=1e6,
+        message_ttl_s=1e9,
+    )
+    sender = qc.ChatSender(settings, max_queue=64)
+    engine = qc.MacroEngine(
+        variation_picker=qc.VariationPicker(corpus),
+        chat_settings=settings,
+        macro_settings=qc.MacroSettings(),
+        message_cooldown_s=600.0,
+        ascii_only=False,
+        persist_path=None,
+        sender=sender,
+        clock=source.clock,
+        # A chat-mode-only pad profile, as with --pad-chat-mode 0=team
+        pad_profiles={0: qc.PadProfile(chat_mode="team")},
+    )
+    actions = [action for _, action in synthetic_stream(engine.macros, events, seed)][:events]
+    button_to_action = {v: k for k, v in qc.BUTTONS.items()}
+
+    def produce() -> None:
+        for action in actions:
+            source.push(action)
+        source.finish()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sender.start()
+        producer = threading.Thread(target=produce, daemon=True)
+        start = time.perf_counter()
+        producer.start()
+        source.open()
+        count = qc.run_input_loop(source, engine, button_to_action)
+        loop_s = time.perf_counter() - start
+        sender.stop(timeout_s=None, drain=True)
+        source.close()
+    lookahead = engine.lookahead
+    stats = sender.stats
+    return {
+        "benchmark": "soak",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "corpus_size": sum(len(v) for v in corpus.values()),
+        "events": count,
+        "events_per_s": count / loop_s if loop_s > 0 else 0.0,
+        "simulated_play_s": count * source.paced_clock.gap_s,
+        "sent": stats.sent,
+        "coalesced": stats.coalesced,
+        "dropped": stats.dropped_full + stats.dropped_stale + stats.preempted,
+        "lookahead_hit_rate": (lookahead.hits / max(1, lookahead.hits + lookahead.misses)) if lookahead else 0.0,
+    }
+
+
+# =============================================================================
+# INPUT LATENCY
+# =============================================================================
+# Event-to-dispatch latency of the two controller input paths: from the moment
+# a D-pad press is handed to the input layer until run_input_loop() passes it
+# to the engine.
+#
+#   evdev   a thread writes raw input_event records into a pipe, and an
+#           EvdevSource reads them with select(), like /dev/input/eventN
+#   pygame  a thread posts hat events into SDL's queue, and a PygameSource
+#           reads them ("wait" mode, the default). Needs pygame; skipped
+#           without it. Runs on SDL's dummy video driver.
+#
+# Presses are matched to dispatches in order, so neither path's own
+# timestamps are trusted. Also reported: the CPU time to decode one event
+# (EvdevParser.feed vs. controller_event_from_pygame).
+# =============================================================================
+
+
+class DispatchProbe:
+    """Stands in for MacroEngine: notes when each input is dispatched."""
+
+    lookahead = None
+
+    def __init__(self) -> None:
+        self.dispatched: List[float] = []
+
+    def handle_action(
+        self,
+        action: str,
+        received_at: Optional[float] = None,
+        instance_id: int = 0,
+        event_time: Optional[float] = None,
+    ) -> None:
+        self.dispatched.append(time.perf_counter())
+
+    def forget_pad(self, instance_id: int) -> None:
+        pass
+
+    def housekeeping(self) -> None:
+        pass
+
+
+def _latency_summary(sent: Sequence[float], dispatched: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(d - s for s, d in zip(sent, dispatched))
+    return {
+        "events": len(ordered),
+        "p50_us": _percentile(ordered, 0.50) * 1e6,
+        "p99_us": _percentile(ordered, 0.99) * 1e6,
+        "max_us": (ordered[-1] * 1e6) if ordered else 0.0,
+    }
+
+
+def _evdev_press(up: bool) -> bytes:
+    now = time.monotonic()
+    seconds, micros = int(now), int((now % 1.0) * 1e6)
+    return qc.EVDEV_EVENT.pack(seconds, micros, qc.EV_ABS, qc.ABS_HAT0Y, -1 if up else 0) + qc.EVDEV_EVENT.pack(
+        seconds, micros, qc.EV_SYN, qc.SYN_REPORT, 0
+    )
+
+
+def bench_evdev_latency(events: int, interval_s: float) -> Dict[str, object]:
+    """Presses written to a pipe, read by an EvdevSource."""
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    source = qc.EvdevSource()
+    source.add_device(read_fd, "pipe", qc.EvdevParser(0, time_offset=0.0))
+    probe = DispatchProbe()
+    sent: List[float] = []
+
+    def produce() -> None:
+        for _ in range(events):
+            time.sleep(interval_s)
+            sent.append(time.perf_counter())
+            os.write(write_fd, _evdev_press(True))
+            os.write(write_fd, _evdev_press(False))  # Release: no dispatch
+        os.close(write_fd)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    qc.run_input_loop(source, probe, {})  # type: ignore[arg-type]
+    producer.join()
+    source.close()
+    return {"path": "evdev", **_latency_summary(sent, probe.dispatched)}
+
+
+def bench_pygame_latency(events: int, interval_s: float) -> Dict[str, object]:
+    """Presses posted to SDL's queue, read by a PygameSource."""
+    if qc.pygame is None:
+        return {"path": "pygame", "skipped": "pygame is not installed"}
+    pygame = qc.pygame
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    try:
+        qc.init_pygame_for_input()
+        pygame.event.post(pygame.event.Event(pygame.JOYHATMOTION, value=(0, 0), joy=0, instance_id=0))
+        pygame.event.clear()
+    except Exception as e:
+        return {"path": "pygame", "skipped": f"can't post joystick events here: {e}"}
+    source = qc.PygameSource("wait")
+    probe = DispatchProbe()
+    sent: List[float] = []
+    done = threading.Event()
+
+    def produce() -> None:
+        for _ in range(events):
+            time.sleep(interval_s)
+            sent.append(time.perf_counter())
+            pygame.event.post(pygame.event.Event(pygame.JOYHATMOTION, value=(0, 1), joy=0, instance_id=0))
+            pygame.event.post(pygame.event.Event(pygame.JOYHATMOTION, value=(0, 0), joy=0, instance_id=0))
+        done.set()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    # A PygameSource never runs out, so this is run_input_loop() with an end
+    while len(probe.dispatched) < events:
+        batch = source.poll() or []
+        for event in batch:
+            qc.dispatch_controller_event(event, probe, {})  # type: ignore[arg-type]
+        if not batch and done.is_set():
+            break  # SDL dropped some; report what arrived
+    source.close()
+    return {"path": "pygame", **_latency_summary(sent, probe.dispatched)}
+
+
+def bench_decode(number: int) -> Dict[str, float]:
+    """CPU time to turn one raw event into a ControllerEvent, per path."""
+    record = qc.EVDEV_EVENT.pack(1000, 0, qc.EV_ABS, qc.ABS_HAT0Y, -1)
+    release = qc.EVDEV_EVENT.pack(1000, 0, qc.EV_ABS, qc.ABS_HAT0Y, 0)
+    parser = qc.EvdevParser(0, time_offset=0.0)
+
+    def evdev_decode() -> None:
+        parser.feed(record)
+        parser.feed(release)
+
+    result = {"evdev_decode_ns": min(timeit.repeat(evdev_decode, number=number, repeat=3)) / number / 2 * 1e9}
+    if qc.pygame is not None:
+        event = qc.pygame.event.Event(qc.pygame.JOYHATMOTION, value=(0, 1), joy=0, instance_id=0)
+        result["pygame_decode_ns"] = min(
+            timeit.repeat(lambda: qc.controller_event_from_pygame(event, 0.0), number=number, repeat=3)
+        ) / number * 1e9
+    return result
+
+
+def bench_input_latency(events: int, interval_s: float) -> Dict[str, object]:
+    """Compare the evdev and pygame input paths."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [bench_evdev_latency(events, interval_s), bench_pygame_latency(events, interval_s)]
+    return {
+        "benchmark": "input-latency",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "interval_ms": interval_s * 1000.0,
+        "results": results,
+        **bench_decode(20000),
+    }
+
+
+# =============================================================================
+# DELIVERY BACKENDS
+# =============================================================================
+# Time to get a message of a given length "into chat" with each keystroke
+# backend. The pyautogui and clipboard backends really press keys, so they
+# only run when asked for by name, after a countdown to focus a scratch window
+# (a text editor, not Rocket League).
+# =============================================================================
+
+DELIVERY_LENGTHS: Tuple[int, ...] = (10, 40, 100, 200)
+SAFE_BACKENDS: Tuple[str, ...] = ("memory", "dry-run")
+
+
+def _message_of_length(length: int) -> str:
+    text = "CAT FAX: Cats sleep 16 hours a day. I sleep through kickoffs. "
+    return (text * (length // len(text) + 1))[:length].rstrip() or "x"
+
+
+def bench_delivery(backends: Sequence[str], lengths: Sequence[int], repeat: int) -> Dict[str, object]:
+    """Time backend.deliver() for each backend and message length."""
+    results: List[Dict[str, object]] = []
+    for name in backends:
+        backend = qc.make_backend(qc.ChatSettings(backend=name))
+        try:
+            backend.warm()
+        except ImportError as e:
+            results.append({"backend": name, "skipped": f"not available: {e}"})
+            continue
+        for length in lengths:
+            message = _message_of_length(length)
+            samples: List[float] = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    backend.deliver(message, qc.DEFAULT_CHAT_KEYS["lobby"])
+                    samples.append(time.perf_counter() - t0)
+            ordered = sorted(samples)
+            results.append({
+                "backend": name,
+                "length": len(message),
+                "repeat": repeat,
+                "p50_ms": _percentile(ordered, 0.50) * 1000.0,
+                "max_ms": ordered[-1] * 1000.0,
+                "per_char_us": _percentile(ordered, 0.50) / len(message) * 1e6,
+            })
+    return {
+        "benchmark": "delivery",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="DS5 Quickchats benchmarks.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    render = sub.add_parser("render", help="Compiled templates vs. the legacy parser")
+    render.add_argument("--number", type=int, default=20000, help="Renders per timing run (default: 20000)")
+    suite = sub.add_parser("suite", help="Input-to-chat pipeline across corpus sizes (JSON output)")
+    suite.add_argument(
+        "--sizes",
+        default=",".join(str(n) for n in DEFAULT_SIZES),
+        help="Comma-separated corpus sizes (default: 250,1000,10000,100000)",
+    )
+    suite.add_argument("--combos", type=int, default=2000, help="Combos in the synthetic stream (default: 2000)")
+    suite.add_argument("--seed", type=int, default=1234, help="Random seed (default: 1234)")
+    suite.add_argument(
+        "--stream",
+        default="",
+        help="Replay this stream (a --record file or text file) instead of a synthetic one",
+    )
+    suite.add_argument("--output", default="", help="Write the JSON report here instead of stdout")
+    suite.add_argument("--baseline", default="", help="Compare against a previous JSON report")
+    suite.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown vs. the baseline before failing (default: 0.25 = 25%%)",
+    )
+    soak = sub.add_parser("soak", help="Inputs through the real input loop and sender, headless (JSON)")
+    soak.add_argument("--events", type=int, default=100000, help="Inputs to push (default: 100000)")
+    soak.add_argument("--size", type=int, default=1000, help="Corpus size (default: 1000)")
+    soak.add_argument("--seed", type=int, default=1234, help="Random seed (default: 1234)")
+    latency = sub.add_parser("input-latency", help="Event-to-dispatch latency: evdev vs. pygame (JSON)")
+    latency.add_argument("--events", type=int, default=2000, help="D-pad presses per path (default: 2000)")
+    latency.add_argument("--interval-ms", type=float, default=2.0, help="Time between presses (default: 2)")
+    delivery = sub.add_parser("delivery", help="Time to deliver messages with each keystroke backend (JSON)")
+    delivery.add_argument(
+        "--backends",
+        default=",".join(SAFE_BACKENDS),
+        help="Comma-separated backends (default: memory,dry-run). pyautogui and "
+             "clipboard really type - focus a scratch text editor first!",
+    )
+    delivery.add_argument(
+        "--lengths",
+        default=",".join(str(n) for n in DELIVERY_LENGTHS),
+        help="Comma-separated message lengths (default: 10,40,100,200)",
+    )
+    delivery.add_argument("--repeat", type=int, default=5, help="Deliveries per length (default: 5)")
+    delivery.add_argument("--countdown", type=int, default=5, help="Seconds to wait before typing (default: 5)")
+    args = parser.parse_args(argv)
+
+    if args.bench == "render":
+        bench_render(args.number)
+        return 0
+
+    if args.bench == "soak":
+        print(json.dumps(run_soak(max(1, args.events), max(1, args.size), args.seed), indent=2))
+        return 0
+
+    if args.bench == "input-latency":
+        if not sys.platform.startswith("linux"):
+            print("input-latency needs Linux (evdev)", file=sys.stderr)
+            return 2
+        print(json.dumps(bench_input_latency(max(1, args.events), max(0.0, args.interval_ms) / 1000.0), indent=2))
+        return 0
+
+    if args.bench == "delivery":
+        backends = [b.strip() for b in str(args.backends).split(",") if b.strip()]
+        unknown = [b for b in backends if b not in qc.CHAT_BACKENDS]
+        if unknown:
+            parser.error(f"unknown backends {unknown}; choose from {list(qc.CHAT_BACKENDS)}")
+        if any(b not in SAFE_BACKENDS for b in backends):
+            print(
+                f"Real keystrokes in {args.countdown} s - focus a scratch text editor now!",
+                file=sys.stderr,
+            )
+            time.sleep(max(0, args.countdown))
+        lengths = [int(n) for n in str(args.lengths).split(",") if n.strip()]
+        print(json.dumps(bench_delivery(backends, lengths, max(1, args.repeat)), indent=2))
+        return 0
+
+    sizes = [int(n) for n in str(args.sizes).split(",") if n.strip()]
+    report = run_suite(sizes, args.combos, args.seed, args.stream or None)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())